@@ -1,51 +1,195 @@
+import os
 import snowflake.connector
 import streamlit as st
 import altair as alt
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-import plotly.graph_objects as go
+
+from engine.cache import ResultCache
+from engine.chartdata import chart_frame, coarsen
+from engine.flows import bridge_flows, cex_inflows, retained_in_ink
+from engine.holdings import combine_chains, holdings_by_asset, holdings_by_chain
+from engine.incremental import IncrementalExtract
+from engine.lending import (
+    deposit_size_distribution,
+    inflows_outflows_by_token,
+    lending_totals,
+)
+from engine.loader import QueryLoader
+from engine.metrics import QueryMetrics
+from engine.pool import ConnectionPool
+from engine.rollups import DailyRollup
+from engine.scheduler import QueryScheduler, Section, render_when_ready
+from engine.sources import (
+    BRIDGE_ACTIVITY_QUERY,
+    DEFAULT_QUERY_TTL,
+    HOLDINGS_QUERIES,
+    LENDING_ROLLUP,
+    LIQUIDITY_QUERY,
+    PERIOD_CHOICES,
+    QUERY_TTLS,
+    TIME_RANGES,
+    TYDRO_EVENTS_QUERY,
+    USER_FLOW_QUERY,
+    empty_query_result,
+    fetch_query,
+    time_range,
+)
+from engine.store import ResultStore
+from engine.templates import TimeRange
+from engine.transitions import sankey_links
 
 st.set_page_config(layout="wide", page_title="Trdro on Ink Dashbaord")
 
-def read_sql(file_path: str) -> str:
-    path = Path(file_path)
-    if not path.exists():
-        st.error(f"SQL file not found: {file_path}")
-        return ""
-    return path.read_text()
-
-
-def load_query_data(conn, file_path: str, condition: str, period: str):
-    sql_query = read_sql(file_path)
-    if not sql_query:
-        return []
-    sql_query = sql_query.replace("{condition}", condition)
-    sql_query = sql_query.replace("{period}", period)
-    with st.spinner("Loading data..."):
-        cursor = conn.cursor()
-        try:
-            cursor.execute(sql_query)
-            return cursor.fetchall()
-        except Exception as e:
-            st.error(f"Query execution failed: {e}")
-            return []
-        finally:
-            try:
-                cursor.close()
-            except Exception:
-                pass
-
-def plot_cex_to_ink_inflow_volume_by_chain(conn, condition, period):
-    results = load_query_data(conn, "queries/cex-to-ink-inflow-volume-by-chain.sql", condition, period)
-    if not results:
+# Cached result frames are handed to every session; copy-on-write keeps
+# a section's column edits from leaking into the shared copy
+pd.set_option("mode.copy_on_write", True)
+
+# Event types shown on each side of the user-flow Sankey; the rest are "Other"
+SANKEY_TOP_EVENTS = 10
+
+# Memory (bytes) the in-process result cache may hold across all sessions;
+# TYDRO_CACHE_MB overrides it
+RESULT_CACHE_BYTES = int(os.environ.get("TYDRO_CACHE_MB", "512")) << 20
+
+# Upper bound on warehouse queries in flight across all sessions
+MAX_CONCURRENT_QUERIES = 8
+
+# Seconds an unused warehouse session is kept around for reuse
+CONNECTION_IDLE_TIMEOUT = 900
+
+# Queries are submitted with execute_async and polled by query id, starting
+# at this many seconds between polls (doubling up to the max)
+QUERY_POLL_INTERVAL = 0.25
+QUERY_MAX_POLL_INTERVAL = 2.0
+
+# Where locally persisted query data lives
+DATA_DIR = Path(os.environ.get("TYDRO_DATA_DIR", ".tydro-data"))
+
+# Per-query timings: appended to queries.jsonl and summarized in queries.prom
+# (Prometheus text format) under METRICS_DIR; TYDRO_DIAGNOSTICS=0 hides the panel
+METRICS_DIR = DATA_DIR / "metrics"
+SHOW_DIAGNOSTICS = os.environ.get("TYDRO_DIAGNOSTICS", "1") != "0"
+
+# Age (seconds) after which a persisted snapshot is served but refreshed in the background
+DEFAULT_STALE_AFTER = DEFAULT_QUERY_TTL
+QUERY_STALE_AFTER = QUERY_TTLS
+
+
+@st.cache_resource
+def get_result_cache():
+    # Shared by every rerun and every session of this process
+    return ResultCache(max_bytes=RESULT_CACHE_BYTES, default_ttl=DEFAULT_QUERY_TTL, ttls=QUERY_TTLS)
+
+
+@st.cache_resource
+def get_connection_pool():
+    # One slot per query worker, so every concurrent query gets its own session.
+    # The credentials must name a database and schema for the loader's temporary tables
+    credentials = dict(st.secrets["snowflake"])
+    return ConnectionPool(
+        lambda: snowflake.connector.connect(**credentials),
+        max_size=MAX_CONCURRENT_QUERIES,
+        idle_timeout=CONNECTION_IDLE_TIMEOUT,
+    )
+
+
+@st.cache_resource
+def get_result_store():
+    return ResultStore(DATA_DIR / "results", default_stale_after=DEFAULT_STALE_AFTER, stale_after=QUERY_STALE_AFTER)
+
+
+@st.cache_resource
+def get_query_metrics():
+    return QueryMetrics(jsonl_path=METRICS_DIR / "queries.jsonl")
+
+
+@st.cache_resource
+def get_query_executor():
+    return ThreadPoolExecutor(max_workers=MAX_CONCURRENT_QUERIES, thread_name_prefix="tydro-query")
+
+
+@st.cache_resource
+def get_query_loader():
+    return QueryLoader(
+        get_connection_pool(),
+        get_result_cache(),
+        get_result_store(),
+        get_query_executor(),
+        poll_interval=QUERY_POLL_INTERVAL,
+        max_poll_interval=QUERY_MAX_POLL_INTERVAL,
+    )
+
+
+@st.cache_resource
+def get_events_extract():
+    # Full event history as the warehouse returns it (valued on read), persisted
+    # locally and topped up from its watermark; served as held while the
+    # top-up runs in the background
+    return IncrementalExtract(DATA_DIR / "tydro-events-raw", max_age=DEFAULT_QUERY_TTL, background=get_query_executor())
+
+
+@st.cache_resource
+def get_price_table():
+    # Daily token prices the events are valued with, topped up like the events
+    return IncrementalExtract(
+        DATA_DIR / "token-prices", timestamp_column="date", max_age=DEFAULT_QUERY_TTL, background=get_query_executor()
+    )
+
+
+@st.cache_resource
+def get_pool_index():
+    # Liquidity pools seen so far, topped up as often as the breakdown is refreshed
+    return IncrementalExtract(
+        DATA_DIR / "liquidity-pools", max_age=QUERY_TTLS[LIQUIDITY_QUERY], background=get_query_executor()
+    )
+
+
+def load_query_data(scheduler, file_path: str, condition: TimeRange, period: str) -> pd.DataFrame:
+    try:
+        return scheduler.result(file_path, condition, period).copy(deep=False)
+    except FileNotFoundError as e:
+        st.error(str(e))
+        return empty_query_result(file_path)
+    except Exception as e:
+        st.error(f"Query execution failed: {e}")
+        return empty_query_result(file_path)
+
+
+def load_tydro_events(scheduler, condition, period):
+    return load_query_data(scheduler, TYDRO_EVENTS_QUERY, condition, period)
+
+
+def load_lending_rollup(scheduler, condition, period):
+    # Daily aggregates + digests; the chosen period is rolled up from these locally
+    try:
+        return scheduler.result(LENDING_ROLLUP, condition, period)
+    except Exception as e:
+        st.error(f"Query execution failed: {e}")
+        return DailyRollup.from_events(empty_query_result(TYDRO_EVENTS_QUERY))
+
+
+def load_holdings(scheduler, condition, period):
+    # Only the chains that have answered so far; the section re-renders as the rest land
+    frames = [
+        load_query_data(scheduler, path, condition, period)
+        for path in HOLDINGS_QUERIES
+        if scheduler.done(path, condition, period)
+    ]
+    if len(frames) < len(HOLDINGS_QUERIES):
+        st.caption(f"Loaded {len(frames)} of {len(HOLDINGS_QUERIES)} chains, the rest are still loading...")
+    return combine_chains(frames)
+
+def plot_cex_to_ink_inflow_volume_by_chain(scheduler, condition, period):
+    df = cex_inflows(load_query_data(scheduler, "queries/cex-to-ink-inflow-volume-by-chain.sql", condition, period))
+    if df.empty:
         st.info("No CEX -> Ink inflow data returned by the query.")
         return
 
-    # DataFrame
-    df = pd.DataFrame(results, columns=['LABEL', 'VOLUME_USD'])
-    df.columns = [c.lower() for c in df.columns]   # label, volume_usd
     df['label'] = df['label'].astype(str).str.strip()
-    df = to_num(df, ['volume_usd'])
+    df['volume_usd'] = df['volume_usd'].fillna(0)
 
     # Remove zero rows (pie charts cannot handle zero angles)
     df = df[df['volume_usd'] > 0]
@@ -72,19 +216,13 @@ def plot_cex_to_ink_inflow_volume_by_chain(conn, condition, period):
 
     st.altair_chart(pie, use_container_width=True)
 
-def plot_tydro_users_holdings_on_other_blockchains_by_chain(conn, condition, period):
-    # Load query data
-    query_path = "queries/tydro-users-holdings-on-other-blockchains-by-chain.sql"
-    results = load_query_data(conn, query_path, condition, period)
+def plot_tydro_users_holdings_on_other_blockchains_by_chain(scheduler, condition, period):
+    df = holdings_by_chain(load_holdings(scheduler, condition, period))
 
-    if not results:
+    if df.empty:
         st.info("No data returned for user holdings on other blockchains by chain.")
         return
 
-    # Convert results to DataFrame and normalize column names to lowercase
-    df = pd.DataFrame(results, columns=['CHAIN', 'BALANCE_USD'])
-    df.columns = [c.lower() for c in df.columns]  # chain, balance_usd
-
     # Sort data by balance (USD)
     df = df.sort_values("balance_usd", ascending=False)
 
@@ -107,23 +245,15 @@ def plot_tydro_users_holdings_on_other_blockchains_by_chain(conn, condition, per
 
     st.altair_chart(pie, use_container_width=True)
 
-def plot_bridge_inflows_outflows_by_chain(conn, condition, period):
-    results = load_query_data(conn, "queries/bridge-inflows-outflows-by-chain.sql", condition, period)
-    if not results:
+def plot_bridge_inflows_outflows_by_chain(scheduler, condition, period):
+    df = bridge_flows(load_query_data(scheduler, BRIDGE_ACTIVITY_QUERY, condition, period), 'chain')
+    if df.empty:
         st.info("No bridge inflows/outflows data returned by the query.")
         return
 
-    # Create DataFrame and normalize column names to lowercase
-    df = pd.DataFrame(results, columns=[
-        'DIRECTION', 'CHAIN', 'TRANSACTIONS', 'VOLUME_USD', 'AVERAGE_AMOUNT_USD'
-    ])
-    df.columns = [c.lower() for c in df.columns]   # now: direction, chain, transactions, volume_usd, average_amount_usd
-
     # Normalize text values (direction casing) and whitespace
     df['direction'] = df['direction'].astype(str).str.strip().str.title()  # e.g. "inflow" -> "Inflow"
-
-    # Ensure numeric types
-    df = to_num(df, ['transactions', 'volume_usd', 'average_amount_usd'])
+    df = df.fillna({'volume_usd': 0, 'average_amount_usd': 0})
 
     # Determine desired direction order (prefer Inflow then Outflow if present)
     preferred_dirs = ['Inflow', 'Outflow']
@@ -136,7 +266,7 @@ def plot_bridge_inflows_outflows_by_chain(conn, condition, period):
 
     # Order chains by total volume (largest first) for consistent colors/ordering
     chain_order = (
-        df.groupby('chain')['volume_usd']
+        df.groupby('chain', observed=True)['volume_usd']
         .sum()
         .sort_values(ascending=False)
         .index.tolist()
@@ -160,7 +290,7 @@ def plot_bridge_inflows_outflows_by_chain(conn, condition, period):
             tooltip=[
                 alt.Tooltip('direction:N', title='Direction'),
                 alt.Tooltip('chain:N', title='Chain'),
-                alt.Tooltip('transactions:Q', title='Transactions'),
+                alt.Tooltip('transfers:Q', title='Transfers'),
                 alt.Tooltip('volume_usd:Q', title='Volume (USD)', format=",.0f"),
                 alt.Tooltip('average_amount_usd:Q', title='Avg amount (USD)', format=",.0f"),
             ],
@@ -172,23 +302,16 @@ def plot_bridge_inflows_outflows_by_chain(conn, condition, period):
 
     st.altair_chart(chart, use_container_width=True)
 
-def plot_tydro_users_holdings_on_other_blockchains_by_asset(conn, condition, period):
-    query_path = "queries/tydro-users-holdings-on-other-blockchains-by-asset.sql"
-    results = load_query_data(conn, query_path, condition, period)
+def plot_tydro_users_holdings_on_other_blockchains_by_asset(scheduler, condition, period):
+    df = holdings_by_asset(load_holdings(scheduler, condition, period))
 
-    if not results:
+    if df.empty:
         st.info("No data returned for Tydro users' holdings on other blockchains.")
         return
 
-    # Create DataFrame and normalize column names
-    df = pd.DataFrame(results, columns=['symbol', 'token_address', 'balance_usd'])
-
-    # Normalize column names to lowercase
-    df.columns = [c.lower() for c in df.columns]
-
-    # Clean text and ensure numeric types
+    # Clean text
     df['symbol'] = df['symbol'].astype(str).str.strip()
-    df = to_num(df, ['balance_usd'])
+    df['balance_usd'] = df['balance_usd'].fillna(0)
 
     # Sort by balance_usd (descending)
     df = df.sort_values('balance_usd', ascending=False).reset_index(drop=True)
@@ -229,25 +352,19 @@ def plot_tydro_users_holdings_on_other_blockchains_by_asset(conn, condition, per
 
 
 def plot_liquidity_breakdown_by_tydro_tokens(
-        conn,
+        scheduler,
         condition,
         period
 ):
-    query_path="queries/liquidity-breakdown-by-tydro-tokens.sql"
-    results = load_query_data(conn, query_path, condition, period)
+    df = load_query_data(scheduler, LIQUIDITY_QUERY, condition, period)
 
-    if not results:
+    if df.empty:
         st.info("No liquidity data returned by the query.")
         return
 
-    df = pd.DataFrame(results, columns=['SYMBOL', 'LIQUIDITY', 'LIQUIDITY_USD'])
-
-    df.columns = [c.lower() for c in df.columns]
-
-    # Clean text and ensure numeric
+    # Clean text
     df['symbol'] = df['symbol'].astype(str).str.strip()
-
-    df = to_num(df, ['liquidity', 'liquidity_usd'])
+    df = df.fillna({'liquidity': 0, 'liquidity_usd': 0})
 
     # Sort and limit number of bars shown
     df = df.sort_values('liquidity_usd', ascending=False).reset_index(drop=True)
@@ -303,123 +420,43 @@ def plot_liquidity_breakdown_by_tydro_tokens(
 
 
 def plot_user_flow_sankey(
-        conn,
+        scheduler,
         condition,
         period,
-        preserve='before',
-        query_path="queries/user-behavior-before-and-after-tydro-interaction.sql"
+        query_path=USER_FLOW_QUERY
 ):
 
-    results = load_query_data(conn, query_path, condition, period)
-    if not results:
+    df = load_query_data(scheduler, query_path, condition, period)
+    if df.empty:
         st.info("No data returned from user behavior query.")
         return
 
-    # 2) Build DataFrame
-    df = pd.DataFrame(results, columns=["action_type", "event_name", "users"])
-    df["action_type"] = df["action_type"].astype(str).str.strip().str.title()
-    df["event_name"] = df["event_name"].astype(str).str.strip()
-    df["users"] = pd.to_numeric(df["users"], errors="coerce").fillna(0)
-
-    # Separate Before / After
-    before = df[df["action_type"] == "Before"].set_index("event_name")["users"].to_dict()
-    after = df[df["action_type"] == "After"].set_index("event_name")["users"].to_dict()
-
-    # If one side is missing, no Sankey possible
-    if len(before) == 0 or len(after) == 0:
-        st.warning("Either Before or After data is missing — showing fallback bar chart.")
-        fallback = df.pivot(index="event_name", columns="action_type", values="users").fillna(0)
-        fallback = fallback.reset_index().melt(id_vars="event_name", var_name="phase", value_name="users")
-
-        chart = (
-            alt.Chart(fallback)
-            .mark_bar()
-            .encode(
-                x=alt.X("phase:N", title="Phase"),
-                y=alt.Y("users:Q", title="Users"),
-                color="event_name:N",
-                column=alt.Column("event_name:N", header=alt.Header(labelAngle=270))
-            )
-            .properties(height=300)
-        )
-        st.altair_chart(chart, use_container_width=True)
+    # Exact per-user transitions; event types past the busiest few go to "Other"
+    nodes, links = sankey_links(df, top=SANKEY_TOP_EVENTS)
+    if links.empty:
+        st.warning("No user transitions to show.")
         return
 
-    # 3) Node labels
-    before_events = list(before.keys())
-    after_events = list(after.keys())
-
-    nodes = [f"Before: {e}" for e in before_events] + [f"After: {e}" for e in after_events]
-
-    index_before = {e: i for i, e in enumerate(before_events)}
-    index_after = {e: i + len(before_events) for i, e in enumerate(after_events)}
-
-    # 4) Compute approximate flows
-    before_total = sum(before.values())
-    after_total = sum(after.values())
-
-    sources = []
-    targets = []
-    values = []
-    hover_labels = []
-
-    if preserve not in ("before", "after"):
-        preserve = "before"
-
-    if preserve == "before":
-        # Distribute each Before bucket across After buckets proportionally
-        if after_total == 0:
-            st.error("Cannot build Sankey: After total = 0")
-            return
-        for b in before_events:
-            b_val = before[b]
-            for a in after_events:
-                a_val = after[a]
-                flow = b_val * (a_val / after_total)
-                if flow > 0:
-                    sources.append(index_before[b])
-                    targets.append(index_after[a])
-                    values.append(float(flow))
-                    hover_labels.append(f"{b} → {a}<br>Users (approx.): {flow:,.0f}")
-
-    else:  # preserve == "after"
-        if before_total == 0:
-            st.error("Cannot build Sankey: Before total = 0")
-            return
-        for b in before_events:
-            b_val = before[b]
-            for a in after_events:
-                a_val = after[a]
-                flow = a_val * (b_val / before_total)
-                if flow > 0:
-                    sources.append(index_before[b])
-                    targets.append(index_after[a])
-                    values.append(float(flow))
-                    hover_labels.append(f"{b} → {a}<br>Users (approx.): {flow:,.0f}")
-
-    if not values:
-        st.warning("All computed flows are zero — cannot render Sankey.")
-        return
+    node_colors = nodes["side"].map({"Before": "#8DD3C7", "After": "#FB8072"})
 
-    # 5) Build Sankey diagram
-    node_colors = (
-        ["#8DD3C7"] * len(before_events) +  # Before nodes
-        ["#FB8072"] * len(after_events)     # After nodes
-    )
+    # Plotly is only needed here; imported on first use, not on every page start
+    import plotly.graph_objects as go
 
     sankey = go.Sankey(
         node=dict(
             pad=15,
             thickness=20,
             line=dict(color="black", width=0.5),
-            label=nodes,
-            color=node_colors
+            label=nodes["label"].tolist(),
+            color=node_colors.tolist(),
+            hovertemplate="%{label}<br>Users: %{value:,}<extra></extra>",
         ),
         link=dict(
-            source=sources,
-            target=targets,
-            value=values,
-            hovertemplate=hover_labels
+            source=links["source"].to_numpy(),
+            target=links["target"].to_numpy(),
+            value=links["users"].to_numpy(),
+            customdata=links[["before", "after"]].astype(str).to_numpy(),
+            hovertemplate="%{customdata[0]} → %{customdata[1]}<br>Users: %{value:,}<extra></extra>",
         )
     )
 
@@ -432,23 +469,15 @@ def plot_user_flow_sankey(
 
     st.plotly_chart(fig, use_container_width=True)
 
-def plot_bridge_inflows_outflows_by_token(conn, condition, period):
-    results = load_query_data(conn, "queries/bridge-inflows-outflows-by-token.sql", condition, period)
-    if not results:
+def plot_bridge_inflows_outflows_by_token(scheduler, condition, period):
+    df = bridge_flows(load_query_data(scheduler, BRIDGE_ACTIVITY_QUERY, condition, period), 'symbol')
+    if df.empty:
         st.info("No bridge inflows/outflows data returned by the query.")
         return
 
-    # Create DataFrame and normalize column names to lowercase
-    df = pd.DataFrame(results, columns=[
-        'DIRECTION', 'SYMBOL', 'TRANSACTIONS', 'VOLUME_USD', 'AVERAGE_AMOUNT_USD'
-    ])
-    df.columns = [c.lower() for c in df.columns]   # now: direction, token, transactions, volume_usd, average_amount_usd
-
     # Normalize text values (direction casing) and whitespace
     df['direction'] = df['direction'].astype(str).str.strip().str.title()  # e.g. "inflow" -> "Inflow"
-
-    # Ensure numeric types
-    df = to_num(df, ['transactions', 'volume_usd', 'average_amount_usd'])
+    df = df.fillna({'volume_usd': 0, 'average_amount_usd': 0})
 
     # Determine desired direction order (prefer Inflow then Outflow if present)
     preferred_dirs = ['Inflow', 'Outflow']
@@ -461,7 +490,7 @@ def plot_bridge_inflows_outflows_by_token(conn, condition, period):
 
     # Order tokens by total volume (largest first) for consistent colors/ordering
     token_order = (
-        df.groupby('symbol')['volume_usd']
+        df.groupby('symbol', observed=True)['volume_usd']
         .sum()
         .sort_values(ascending=False)
         .index.tolist()
@@ -485,7 +514,7 @@ def plot_bridge_inflows_outflows_by_token(conn, condition, period):
             tooltip=[
                 alt.Tooltip('direction:N', title='Direction'),
                 alt.Tooltip('symbol:N', title='Token'),
-                alt.Tooltip('transactions:Q', title='Transactions'),
+                alt.Tooltip('transfers:Q', title='Transfers'),
                 alt.Tooltip('volume_usd:Q', title='Volume (USD)', format=",.0f"),
                 alt.Tooltip('average_amount_usd:Q', title='Avg amount (USD)', format=",.0f"),
             ],
@@ -498,24 +527,16 @@ def plot_bridge_inflows_outflows_by_token(conn, condition, period):
     st.altair_chart(chart, use_container_width=True)
 
 
-def plot_tydro_inflows_outflows_by_token(conn, condition, period):
-    results = load_query_data(conn, "queries/inflows-outflows-by-token.sql", condition, period)
-    if not results:
+def plot_tydro_inflows_outflows_by_token(scheduler, condition, period):
+    df = inflows_outflows_by_token(load_tydro_events(scheduler, condition, period))
+    if df.empty:
         st.info("No by-token data returned by the query.")
         return
 
-    # Build DataFrame and normalize column names to lowercase
-    df = pd.DataFrame(results, columns=[
-        'EVENT_NAME', 'SYMBOL', 'VOLUME', 'VOLUME_USD', 'AVERAGE_AMOUNT', 'AVERAGE_AMOUNT_USD'
-    ])
-    df.columns = [c.lower() for c in df.columns]  # now: event_name, symbol, volume, volume_usd, average_amount, average_amount_usd
-
     # Normalize text values and casing
     df['event_name'] = df['event_name'].astype(str).str.strip().str.title()   # e.g. "supply" -> "Supply"
     df['symbol'] = df['symbol'].astype(str).str.strip()
-
-    # Ensure numeric types
-    df = to_num(df, ['volume','volume_usd','average_amount','average_amount_usd'])
+    df = df.fillna(0)
 
     # Desired order for event_name (prefer Supply then Withdraw if present)
     preferred_events = ['Supply', 'Withdraw']
@@ -526,7 +547,7 @@ def plot_tydro_inflows_outflows_by_token(conn, condition, period):
 
     # Order symbols by total volume_usd (descending) for consistent coloring/order
     symbol_order = (
-        df.groupby('symbol')['volume_usd']
+        df.groupby('symbol', observed=True)['volume_usd']
         .sum()
         .sort_values(ascending=False)
         .index.tolist()
@@ -562,126 +583,112 @@ def plot_tydro_inflows_outflows_by_token(conn, condition, period):
 
 
 
-def tydro_general(conn, condition, period):
-    borrow_stats = load_query_data(conn, "queries/total-borrow.sql", condition, period)
-    supply_stats = load_query_data(conn, "queries/total-supply.sql", condition, period)
+def tydro_general(scheduler, condition, period):
+    events = load_tydro_events(scheduler, condition, period)
 
-    prefix = "Borrow"
-    total_transactions, total_users, total_volume_usd, avg_amount_usd, median_amount_usd, max_amount_usd = borrow_stats[0]
-    c1, c2, c3 = st.columns(3)
-    c1.metric(f"{prefix} Transactions", f"{int(total_transactions):,}")
-    c2.metric(f"{prefix} Users", f"{int(total_users):,}")
-    c3.metric(f"{prefix} Volume (USD)", f"${float(total_volume_usd):,.2f}")
-
-    prefix = "Supply"
-    total_transactions, total_users, total_volume_usd, avg_amount_usd, median_amount_usd, max_amount_usd = supply_stats[0]
-    c1, c2, c3 = st.columns(3)
-    c1.metric(f"{prefix} Transactions", f"{int(total_transactions):,}")
-    c2.metric(f"{prefix} Users", f"{int(total_users):,}")
-    c3.metric(f"{prefix} Volume (USD)", f"${float(total_volume_usd):,.2f}")
+    for prefix in ["Borrow", "Supply"]:
+        stats = lending_totals(events, prefix)
+        c1, c2, c3 = st.columns(3)
+        c1.metric(f"{prefix} Transactions", f"{int(stats['transactions']):,}")
+        c2.metric(f"{prefix} Users", f"{int(stats['users']):,}")
+        c3.metric(f"{prefix} Volume (USD)", f"${float(stats['volume_usd']):,.2f}")
 
-def tydro_historical_data(conn, condition, period, period_choice):
+def tydro_historical_data(scheduler, condition, period, period_choice):
     with st.spinner(f"Loading historical data for {range_choice} ({period_choice})..."):
-        overtime_results = load_query_data(conn, "queries/overtime.sql", condition, period)
-
-    if overtime_results:
-        df = pd.DataFrame(overtime_results, columns=[
-            'date','event_name','transactions','users','volume_usd',
-            'average_amount_usd','median_amount_usd','max_amount_usd'
-        ])
-
-        # convert and sanitize
-        df['date'] = pd.to_datetime(df['date'])
-        df = to_num(df, ['transactions','users','volume_usd','average_amount_usd','median_amount_usd','max_amount_usd'])
-
-        # AGGREGATE to ensure one row per date+event (safety)
-        df = df.groupby(['date','event_name'], as_index=False).agg({
-            'transactions':'sum',
-            'users':'sum',
-            'volume_usd':'sum',
-            'average_amount_usd':'mean',
-            'median_amount_usd':'median',
-            'max_amount_usd':'max'
-        }).sort_values('date')
-
-        # separate event dataframes
-        supply_data = df[df['event_name']=='Supply']
-        borrow_data = df[df['event_name']=='Borrow']
-        withdraw_data = df[df['event_name']=='Withdraw']
-        repay_data = df[df['event_name']=='Repay']
-
-
-        # ---------------------------
-        # 3-Column Layout
-        # ---------------------------
-        col1, col2, col3 = st.columns(3)
-
-        # ---------------------------
-        # Transactions per Event (stacked/grouped)
-        # ---------------------------
-        with col1:
-            st.subheader(f"{period_choice} Transactions per Event")
-            chart_tx = (
-                alt.Chart(df)
-                .mark_bar()
-                .encode(
-                    x=alt.X("date:T", title="Date"),
-                    y=alt.Y("transactions:Q", title="Transactions"),
-                    color=alt.Color("event_name:N", title="Event"),
-                    tooltip=[
-                        alt.Tooltip("date:T", title="Date"),
-                        alt.Tooltip("event_name:N", title="Event"),
-                        alt.Tooltip("transactions:Q", title="Transactions"),
-                        alt.Tooltip("users:Q", title="Active Users"),
-                        alt.Tooltip("volume_usd:Q", title="Volume USD", format=","),
-                    ],
-                )
-                .properties(height=350)
-                .interactive()
+        rollup = load_lending_rollup(scheduler, condition, period)
+        df = rollup.rollup(period).fillna(0)
+
+    if df.empty:
+        st.info("No historical data for the selected range.")
+        return
+
+    # Bars move to a coarser period when there are more of them than pixels
+    bars, bar_period = coarsen(lambda p: rollup.rollup(p).fillna(0), period)
+    bar_choice = next(choice for choice, p in PERIOD_CHOICES.items() if p == bar_period)
+    if bar_period != period:
+        st.caption(f"Too many {period_choice.lower()} bars for this range; bar charts show {bar_choice.lower()} totals.")
+
+    # separate event dataframes; each chart below gets only the columns it
+    # plots, lines thinned to about their pixel width (see engine/chartdata.py)
+    supply_data = df[df['event_name']=='Supply']
+    borrow_data = df[df['event_name']=='Borrow']
+    withdraw_data = df[df['event_name']=='Withdraw']
+    repay_data = df[df['event_name']=='Repay']
+    supply_bars = bars[bars['event_name']=='Supply']
+    borrow_bars = bars[bars['event_name']=='Borrow']
+
+
+    # ---------------------------
+    # 3-Column Layout
+    # ---------------------------
+    col1, col2, col3 = st.columns(3)
+
+    # ---------------------------
+    # Transactions per Event (stacked/grouped)
+    # ---------------------------
+    with col1:
+        st.subheader(f"{bar_choice} Transactions per Event")
+        chart_tx = (
+            alt.Chart(chart_frame(bars, "date", "transactions", by="event_name", tooltip=["users", "volume_usd"], max_points=None))
+            .mark_bar()
+            .encode(
+                x=alt.X("date:T", title="Date"),
+                y=alt.Y("transactions:Q", title="Transactions"),
+                color=alt.Color("event_name:N", title="Event"),
+                tooltip=[
+                    alt.Tooltip("date:T", title="Date"),
+                    alt.Tooltip("event_name:N", title="Event"),
+                    alt.Tooltip("transactions:Q", title="Transactions"),
+                    alt.Tooltip("users:Q", title="Active Users"),
+                    alt.Tooltip("volume_usd:Q", title="Volume USD", format=","),
+                ],
             )
-            st.altair_chart(chart_tx, use_container_width=True)
+            .properties(height=350)
+            .interactive()
+        )
+        st.altair_chart(chart_tx, use_container_width=True)
 
-        # ---------------------------
-        # Active users per event
-        # ---------------------------
-        with col2:
-            st.subheader(f"{period_choice} Active Users per Event")
-            chart_users = (
-                alt.Chart(df)
-                .mark_bar()
-                .encode(
-                    x="date:T",
-                    y="users:Q",
-                    color="event_name:N",
-                    tooltip=["date:T", "event_name:N", "users:Q"],
-                )
-                .properties(height=350)
-                .interactive()
+    # ---------------------------
+    # Active users per event
+    # ---------------------------
+    with col2:
+        st.subheader(f"{bar_choice} Active Users per Event")
+        chart_users = (
+            alt.Chart(chart_frame(bars, "date", "users", by="event_name", max_points=None))
+            .mark_bar()
+            .encode(
+                x="date:T",
+                y="users:Q",
+                color="event_name:N",
+                tooltip=["date:T", "event_name:N", "users:Q"],
             )
-            st.altair_chart(chart_users, use_container_width=True)
-
-        # ---------------------------
-        # Volume (USD) per event (line)
-        # ---------------------------
-        with col3:
-            st.subheader(f"{period_choice} Volume (USD) per Event")
-            chart_volume = (
-                alt.Chart(df)
-                .mark_line(point=True)
-                .encode(
-                    x="date:T",
-                    y=alt.Y("volume_usd:Q", title="Volume (USD)"),
-                    color="event_name:N",
-                    tooltip=[
-                        "date:T",
-                        "event_name:N",
-                        alt.Tooltip("volume_usd:Q", format=","),
-                    ],
-                )
-                .properties(height=350)
-                .interactive()
+            .properties(height=350)
+            .interactive()
+        )
+        st.altair_chart(chart_users, use_container_width=True)
+
+    # ---------------------------
+    # Volume (USD) per event (line)
+    # ---------------------------
+    with col3:
+        st.subheader(f"{period_choice} Volume (USD) per Event")
+        chart_volume = (
+            alt.Chart(chart_frame(df, "date", "volume_usd", by="event_name"))
+            .mark_line(point=True)
+            .encode(
+                x="date:T",
+                y=alt.Y("volume_usd:Q", title="Volume (USD)"),
+                color="event_name:N",
+                tooltip=[
+                    "date:T",
+                    "event_name:N",
+                    alt.Tooltip("volume_usd:Q", format=","),
+                ],
             )
-            st.altair_chart(chart_volume, use_container_width=True)
+            .properties(height=350)
+            .interactive()
+        )
+        st.altair_chart(chart_volume, use_container_width=True)
 
     # 1st row of charts
     row1_col1, row1_col2, row1_col3 = st.columns(3)
@@ -690,9 +697,9 @@ def tydro_historical_data(conn, condition, period, period_choice):
     # Weekly Supply Transactions (bar)
     # ---------------------------
     with row1_col1:
-        st.markdown(f"### {period_choice} Supply Transactions")
+        st.markdown(f"### {bar_choice} Supply Transactions")
         chart_supply_tx = (
-            alt.Chart(supply_data)
+            alt.Chart(chart_frame(supply_bars, "date", "transactions", max_points=None))
             .mark_bar()
             .encode(
                 x="date:T",
@@ -710,7 +717,7 @@ def tydro_historical_data(conn, condition, period, period_choice):
     with row1_col2:
         st.markdown(f"### {period_choice} Supply Volume (USD)")
         chart_supply_volume = (
-            alt.Chart(supply_data)
+            alt.Chart(chart_frame(supply_data, "date", "volume_usd"))
             .mark_line(point=True)
             .encode(
                 x="date:T",
@@ -726,9 +733,9 @@ def tydro_historical_data(conn, condition, period, period_choice):
     # Weekly Active Suppliers (bar)
     # ---------------------------
     with row1_col3:
-        st.markdown(f"### {period_choice} Active Suppliers")
+        st.markdown(f"### {bar_choice} Active Suppliers")
         chart_supply_users = (
-            alt.Chart(supply_data)
+            alt.Chart(chart_frame(supply_bars, "date", "users", max_points=None))
             .mark_bar()
             .encode(
                 x="date:T",
@@ -747,9 +754,9 @@ def tydro_historical_data(conn, condition, period, period_choice):
     # Weekly Borrow Transactions (bar)
     # ---------------------------
     with row2_col1:
-        st.markdown(f"### {period_choice} Borrow Transactions")
+        st.markdown(f"### {bar_choice} Borrow Transactions")
         chart_borrow_tx = (
-            alt.Chart(borrow_data)
+            alt.Chart(chart_frame(borrow_bars, "date", "transactions", max_points=None))
             .mark_bar()
             .encode(
                 x="date:T",
@@ -767,7 +774,7 @@ def tydro_historical_data(conn, condition, period, period_choice):
     with row2_col2:
         st.markdown(f"### {period_choice} Borrow Volume (USD)")
         chart_borrow_volume = (
-            alt.Chart(borrow_data)
+            alt.Chart(chart_frame(borrow_data, "date", "volume_usd"))
             .mark_line(point=True)
             .encode(
                 x="date:T",
@@ -783,9 +790,9 @@ def tydro_historical_data(conn, condition, period, period_choice):
     # Weekly Active Borrowers (bar)
     # ---------------------------
     with row2_col3:
-        st.markdown(f"### {period_choice} Active Borrowers")
+        st.markdown(f"### {bar_choice} Active Borrowers")
         chart_borrow_users = (
-            alt.Chart(borrow_data)
+            alt.Chart(chart_frame(borrow_bars, "date", "users", max_points=None))
             .mark_bar()
             .encode(
                 x="date:T",
@@ -798,48 +805,35 @@ def tydro_historical_data(conn, condition, period, period_choice):
         st.altair_chart(chart_borrow_users, use_container_width=True)
 
 
-def to_num(df, cols):
-    for c in cols:
-        df[c] = pd.to_numeric(df[c].astype(str).str.replace(',',''), errors='coerce').fillna(0)
-    return df
-
-
-def display_bridge_big_numbers(conn, condition, period):
-    bridge_stats = load_query_data(conn, "queries/total-bridge.sql", condition, period)
+def display_bridge_big_numbers(scheduler, condition, period):
+    events = load_tydro_events(scheduler, condition, period)
+    bridged_out = load_query_data(scheduler, "queries/total-bridge.sql", condition, period)
+    if events.empty and bridged_out.empty:
+        st.info("No bridge totals returned by the query.")
+        return
 
-    total_borrowed_volume_of_tydro, total_bridged_out_volume, borrowed_vs_bridged_out = bridge_stats[0]
+    bridge_stats = retained_in_ink(lending_totals(events, "Borrow")['volume_usd'], bridged_out)
+    total_borrowed_volume_of_tydro, total_bridged_out_volume, borrowed_vs_bridged_out = bridge_stats.values()
     c1, c2, c3 = st.columns(3)
     c1.metric(f"Total Borrowed Volume of Tydro", f"{int(total_borrowed_volume_of_tydro):,}")
     c2.metric(f"Total Bridged out Volume (USD)", f"{int(total_bridged_out_volume):,}")
     c3.metric(f"Borrowed vs. Bridged-Out Ratio", f"%{float(borrowed_vs_bridged_out):,.2f}")
 
 
-def plot_deposit_size_distribution(conn, condition, period):
+def plot_deposit_size_distribution(scheduler, condition, period):
     title="Deposit Size Distribution — Volume per Bucket"
-    deposit_results = load_query_data(conn, "queries/deposit-size-distribution.sql", condition, period)
-
-    if not deposit_results:
-        st.warning("No deposit size data available.")
-        return
 
     # -----------------------------------
-    # Load into Frame
+    # Bucket the Supply events locally
     # -----------------------------------
-    df = pd.DataFrame(deposit_results, columns=[
-        'DEPOSIT_SIZE_RANGE','DEPOSIT_COUNT','TOTAL_DEPOSIT_USD','MIN_AMOUNT_USD','MAX_AMOUNT_USD'
-    ])
-
-    # Fix mojibake or dash issues
-    df['DEPOSIT_SIZE_RANGE'] = (
-        df['DEPOSIT_SIZE_RANGE'].astype(str)
-        .str.replace('â€“', '–')
-        .str.replace('-', '–')
-        .str.strip()
-    )
+    df = deposit_size_distribution(load_tydro_events(scheduler, condition, period))
 
-    # Numeric columns
-    for col in ['DEPOSIT_COUNT','TOTAL_DEPOSIT_USD','MIN_AMOUNT_USD','MAX_AMOUNT_USD']:
-        df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    if df.empty:
+        st.warning("No deposit size data available.")
+        return
+
+    df = df.rename(columns=str.upper)
+    df['DEPOSIT_SIZE_RANGE'] = df['DEPOSIT_SIZE_RANGE'].astype(str)
 
     # -----------------------------------
     # AUTO-SORT BUCKETS from MIN_AMOUNT_USD
@@ -894,72 +888,161 @@ def plot_deposit_size_distribution(conn, condition, period):
 
     st.altair_chart(chart + text, use_container_width=True)
 
-try:
-    conn = snowflake.connector.connect(
-        user='afonsodiaz',
-        password='cnuppNkP8qk7TNK',
-        account='gob41769.us-east-1',
-        warehouse='INK_ENGINE',
-        database='INK',
-        schema='CORE'
-    )
 
+# Query files each section needs before it can render
+SECTION_QUERIES = {
+    tydro_general: [TYDRO_EVENTS_QUERY],
+    tydro_historical_data: [LENDING_ROLLUP],
+    plot_deposit_size_distribution: [TYDRO_EVENTS_QUERY],
+    plot_tydro_inflows_outflows_by_token: [TYDRO_EVENTS_QUERY],
+    display_bridge_big_numbers: [TYDRO_EVENTS_QUERY, "queries/total-bridge.sql"],
+    plot_bridge_inflows_outflows_by_chain: [BRIDGE_ACTIVITY_QUERY],
+    plot_bridge_inflows_outflows_by_token: [BRIDGE_ACTIVITY_QUERY],
+    plot_cex_to_ink_inflow_volume_by_chain: ["queries/cex-to-ink-inflow-volume-by-chain.sql"],
+    plot_user_flow_sankey: [USER_FLOW_QUERY],
+    plot_liquidity_breakdown_by_tydro_tokens: [LIQUIDITY_QUERY],
+    plot_tydro_users_holdings_on_other_blockchains_by_asset: HOLDINGS_QUERIES,
+    plot_tydro_users_holdings_on_other_blockchains_by_chain: HOLDINGS_QUERIES,
+}
+
+# Page sections grouped as the section selector shows them, in the order
+# viewers usually open them (the first is open by default)
+SECTION_GROUPS = {
+    "Lending": [
+        tydro_general,
+        tydro_historical_data,
+        plot_deposit_size_distribution,
+        plot_tydro_inflows_outflows_by_token,
+    ],
+    "Bridges": [
+        display_bridge_big_numbers,
+        plot_bridge_inflows_outflows_by_chain,
+        plot_bridge_inflows_outflows_by_token,
+        plot_cex_to_ink_inflow_volume_by_chain,
+    ],
+    "User flow": [plot_user_flow_sankey],
+    "Liquidity & holdings": [
+        plot_liquidity_breakdown_by_tydro_tokens,
+        plot_tydro_users_holdings_on_other_blockchains_by_asset,
+        plot_tydro_users_holdings_on_other_blockchains_by_chain,
+    ],
+}
+# Groups after the open one whose queries are prefetched once it has rendered
+PREFETCH_GROUPS = 1
+
+
+def group_queries(group):
+    return list(dict.fromkeys(path for render in SECTION_GROUPS[group] for path in SECTION_QUERIES[render]))
+
+
+def next_groups(group):
+    names = list(SECTION_GROUPS)
+    position = names.index(group)
+    return names[position + 1:position + 1 + PREFETCH_GROUPS]
+
+
+# Sections drawn from whatever part of their queries has finished
+PARTIAL_SECTIONS = {
+    plot_tydro_users_holdings_on_other_blockchains_by_asset,
+    plot_tydro_users_holdings_on_other_blockchains_by_chain,
+}
+
+
+try:
     # Settings
     with st.expander("⚙️ Configuration", expanded=True):
         col1, col2 = st.columns(2)
         with col1:
-            range_choice = st.radio("Select Time Range:", ["All time", "Past year", "Past month", "Past week"], horizontal=True)
+            range_choice = st.radio("Select Time Range:", list(TIME_RANGES), horizontal=True)
         with col2:
-            period_choice = st.radio("Select Aggregation Period:", ["Daily", "Weekly", "Monthly"], horizontal=True)
+            period_choice = st.radio("Select Aggregation Period:", list(PERIOD_CHOICES), horizontal=True)
 
-        if range_choice == "All time":
-            condition = "1 = 1"
-        elif range_choice == "Past year":
-            condition = "block_timestamp::date >= current_date - interval '1 year'"
-        elif range_choice == "Past month":
-            condition = "block_timestamp::date >= current_date - interval '1 month'"
-        else:
-            condition = "block_timestamp::date >= current_date - interval '7 day'"
+        # Same mapping as the precompute job, so its results are found here
+        condition = time_range(range_choice)
+        period = PERIOD_CHOICES[period_choice]
 
-        if period_choice == "Daily":
-            period = "day"
-        elif period_choice == "Weekly":
-            period = "week"
-        else:
-            period = "month"
+    get_connection_pool().prune()
+    scheduler = QueryScheduler(
+        get_query_executor(),
+        partial(fetch_query, get_query_loader(), get_events_extract(), get_pool_index(), get_price_table()),
+        metrics=get_query_metrics(),
+    )
 
-    tydro_general(conn, condition, period)
+    def section(render, *args, **kwargs):
+        # Queue the section's SQL right away and reserve its spot on the page
+        futures = [scheduler.submit(path, condition, period) for path in SECTION_QUERIES[render]]
+        placeholder = st.empty()
+        if not all(f.done() for f in futures):
+            placeholder.caption("⏳ Loading...")
+        return Section(
+            placeholder,
+            partial(render, scheduler, condition, period, *args, **kwargs),
+            futures,
+            partial=render in PARTIAL_SECTIONS,
+        )
 
-    tydro_historical_data(conn, condition, period, period_choice)
+    # Only the open group's queries run now; the rest wait until opened
+    group = st.radio("Section:", list(SECTION_GROUPS), horizontal=True, key="section")
 
-    plot_deposit_size_distribution(conn, condition, period)
+    if group == "Lending":
+        sections = [
+            section(tydro_general),
+            section(tydro_historical_data, period_choice),
+            section(plot_deposit_size_distribution),
+            section(plot_tydro_inflows_outflows_by_token),
+        ]
 
-    plot_tydro_inflows_outflows_by_token(conn, condition, period)
+    elif group == "Bridges":
+        sections = [
+            section(display_bridge_big_numbers),
+            section(plot_bridge_inflows_outflows_by_chain),
+        ]
 
-    display_bridge_big_numbers(conn, condition, period)
+        col_left, col_right = st.columns(2)
 
-    plot_bridge_inflows_outflows_by_chain(conn, condition, period)
+        with col_left:
+            sections.append(section(plot_bridge_inflows_outflows_by_token))
 
-    col_left, col_right = st.columns(2)
+        with col_right:
+            sections.append(section(plot_cex_to_ink_inflow_volume_by_chain))
 
-    with col_left:
-        plot_bridge_inflows_outflows_by_token(conn, condition, period)
+    elif group == "User flow":
+        sections = [section(plot_user_flow_sankey)]
 
-    with col_right:
-        plot_cex_to_ink_inflow_volume_by_chain(conn, condition, period)
+    else:
+        sections = [
+            section(plot_liquidity_breakdown_by_tydro_tokens),
+            section(plot_tydro_users_holdings_on_other_blockchains_by_asset),
+            section(plot_tydro_users_holdings_on_other_blockchains_by_chain),
+        ]
 
-    plot_user_flow_sankey(conn, condition, period, preserve='before')
+    # The layout is on the page already; sections fill in as their results land
+    render_when_ready(sections)
 
-    plot_liquidity_breakdown_by_tydro_tokens(conn, condition, period)
+    # While this group is read, warm the cache for the ones likely opened next
+    for next_group in next_groups(group):
+        scheduler.prefetch(group_queries(next_group), condition, period)
 
-    plot_tydro_users_holdings_on_other_blockchains_by_asset(conn, condition, period)
+    metrics = get_query_metrics()
+    try:
+        metrics.write_prometheus(METRICS_DIR / "queries.prom")
+    except OSError:
+        pass
 
-    plot_tydro_users_holdings_on_other_blockchains_by_chain(conn, condition, period)
+    if SHOW_DIAGNOSTICS:
+        with st.expander("🩺 Diagnostics", expanded=False):
+            st.caption("Queries behind this page build (seconds, bytes)")
+            st.dataframe(metrics.frame(scheduler.records), use_container_width=True, hide_index=True)
+            st.caption("All queries since the server started")
+            st.dataframe(metrics.summary(), use_container_width=True, hide_index=True)
+            runs = get_query_loader().stats()
+            st.caption(
+                f"Warehouse runs: {runs['executions']:,} · saved by joining an identical run in flight: "
+                f"{runs['coalesced']:,} · in flight now: {runs['in_flight']}"
+            )
+            c1, c2 = st.columns(2)
+            c1.download_button("Download JSON lines", metrics.to_jsonl(), "tydro-queries.jsonl", "application/jsonl")
+            c2.download_button("Download Prometheus metrics", metrics.to_prometheus(), "tydro-queries.prom", "text/plain")
 
 except Exception as e:
     st.error(f"Connection failed: {e}")
-finally:
-    try:
-        conn.close()
-    except Exception:
-        pass
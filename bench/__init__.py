@@ -0,0 +1 @@
+"""Offline benchmarks against a synthetic DuckDB stand-in for the Ink warehouse."""
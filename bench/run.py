@@ -0,0 +1,317 @@
+"""Offline benchmark of the dashboard against the synthetic warehouse.
+
+    python -m bench.run --events 1000000 --json bench-results.json
+    python -m bench.run --events 1000000 --baseline bench-results.json
+
+Run from the repository root. Three groups of measurements are taken:
+
+* ``query``  - every ``queries/*.sql`` file, all time and past month,
+  executed and decoded through ``engine.loader.execute_query``;
+* ``page``   - full builds of ``app.py`` under Streamlit's ``AppTest``:
+  cold (empty caches and data directory), warm (same inputs again), then
+  the past-month range, the weekly period and each further section group,
+  as a user would click;
+* ``render`` - each section's render function (``plot_*`` and friends)
+  within those builds.
+
+Page builds also report the serialized size of their charts, the bulk of
+what a build sends to the browser.
+
+Latencies are the median of ``--repeat`` runs; peak memory comes from
+one extra ``tracemalloc`` pass (Python and NumPy allocations only; DuckDB
+and Arrow buffers are not traced). With ``--baseline`` the results are
+compared against an earlier ``--json`` file and the exit status is 1 when
+anything got slower, bigger or heavier by more than ``--tolerance``.
+"""
+import argparse
+import datetime as dt
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from unittest import mock
+
+import duckdb
+import pandas as pd
+
+from bench import shim
+from bench.warehouse import generate, table_sizes
+from engine.loader import execute_query, read_sql
+from engine.pools import liquidity_binds, pool_addresses
+from engine.reference import cex_binds
+from engine.schema import parse_schema
+from engine.templates import TimeRange, render
+from engine.touches import first_last_touch, user_flow_binds, user_flow_windows
+
+ROOT = Path(__file__).resolve().parent.parent
+
+RANGES = {"all": TimeRange(), "month": TimeRange.trailing(months=1)}
+
+USER_FLOW_WINDOW = pd.Timedelta(days=7)
+
+# (step, (widget type, index, option) to set first); None re-runs unchanged
+PAGE_STEPS = [
+    ("cold", None),
+    ("warm", None),
+    ("range=Past month", ("radio", 0, "Past month")),
+    ("period=Weekly", ("radio", 1, "Weekly")),
+    ("section=Bridges", ("radio", 2, "Bridges")),
+    ("section=User flow", ("radio", 2, "User flow")),
+    ("section=Liquidity & holdings", ("radio", 2, "Liquidity & holdings")),
+]
+
+# Element types whose protos carry chart data to the browser
+CHART_ELEMENTS = ["arrow_vega_lite_chart", "plotly_chart"]
+
+# Differences below these are noise, whatever the ratio
+MIN_SECONDS = 0.025
+MIN_BYTES = 1 << 20
+
+
+def measure(fn, repeat):
+    """Median seconds over ``repeat`` calls, then the traced peak of one more."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return statistics.median(times), peak
+
+
+def run_file(conn, path, time_range, binds=None):
+    sql_template = read_sql(path)
+    sql_query, params = render(sql_template, time_range, "day", binds)
+    return execute_query(conn, sql_query, params, parse_schema(sql_template))
+
+
+def inputs_for(conn, path, time_range):
+    # Bind parameters and uploaded tables, as the app derives them: the
+    # user-flow query takes its per-user windows from the events, the
+    # holdings queries their users, the liquidity breakdown its pools from
+    # the pool index and the CEX inflows their addresses from the labels
+    if path.name == "cex-to-ink-inflow-volume-by-chain.sql":
+        return cex_binds(run_file(conn, ROOT / "queries" / "cex-labels.sql", TimeRange())), {}
+    if path.name == "liquidity-breakdown-by-tydro-tokens.sql":
+        pools = run_file(conn, ROOT / "queries" / "liquidity-pools.sql", TimeRange())
+        return liquidity_binds(pool_addresses(pools)), {}
+    if path.name.startswith("tydro-users-holdings-on-"):
+        events = run_file(conn, ROOT / "queries" / "tydro-events.sql", TimeRange())
+        return None, {"tydro_users": pd.DataFrame({"address": events["user"].astype(object).unique()})}
+    if path.name == "user-behavior-before-and-after-tydro-interaction.sql":
+        events = run_file(conn, ROOT / "queries" / "tydro-events.sql", time_range)
+        windows = user_flow_windows(first_last_touch(events), USER_FLOW_WINDOW, USER_FLOW_WINDOW)
+        return user_flow_binds(windows), {"tydro_touches": windows}
+    return None, {}
+
+
+def bench_queries(database, repeat):
+    conn = shim.Connection(database)
+    results = {}
+    for path in sorted((ROOT / "queries").glob("*.sql")):
+        sql_template = read_sql(path)
+        schema = parse_schema(sql_template)
+        for range_name, time_range in RANGES.items():
+            binds, tables = inputs_for(conn, path, time_range)
+            for name, frame in tables.items():
+                shim.write_pandas(conn, frame, name)
+            sql_query, params = render(sql_template, time_range, "day", binds)
+            frame = execute_query(conn, sql_query, params, schema)
+            seconds, peak = measure(lambda: execute_query(conn, sql_query, params, schema), repeat)
+            results[f"query:{path.name}:{range_name}"] = {"seconds": seconds, "peak_bytes": peak, "rows": len(frame)}
+            print(f"  {path.name:<60} {range_name:<6} {seconds * 1000:9.1f} ms {peak / 2**20:8.1f} MiB {len(frame):>9} rows")
+    return results
+
+
+class PageRun:
+    """One pass over ``PAGE_STEPS`` in a fresh app session with empty caches."""
+
+    def __init__(self, database, latency, timeout):
+        self.database = database
+        self.latency = latency
+        self.timeout = timeout
+        self.renders = defaultdict(float)
+
+    def _wrap(self, render_when_ready):
+        def timed_render_when_ready(sections):
+            for section in sections:
+                section.render = self._timed(section.render)
+            return render_when_ready(sections)
+        return timed_render_when_ready
+
+    def _timed(self, render_fn):
+        name = getattr(render_fn, "func", render_fn).__name__
+
+        def timed():
+            started = time.perf_counter()
+            try:
+                return render_fn()
+            finally:
+                # Partial sections render more than once; that all counts
+                self.renders[name] += time.perf_counter() - started
+        return timed
+
+    def run(self, trace=False):
+        import engine.scheduler
+        import snowflake.connector
+        from snowflake.connector import pandas_tools
+        import streamlit as st
+        from streamlit.testing.v1 import AppTest
+
+        steps = {}
+        with tempfile.TemporaryDirectory() as data_dir, \
+                mock.patch.dict(os.environ, {"TYDRO_DATA_DIR": data_dir}), \
+                mock.patch.object(snowflake.connector, "connect", shim.connect(self.database, self.latency)), \
+                mock.patch.object(pandas_tools, "write_pandas", shim.write_pandas), \
+                mock.patch.object(engine.scheduler, "render_when_ready", self._wrap(engine.scheduler.render_when_ready)):
+            st.cache_resource.clear()
+            st.cache_data.clear()
+            at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=self.timeout)
+            at.secrets["snowflake"] = {"account": "bench"}
+            for name, click in PAGE_STEPS:
+                if click is not None:
+                    kind, index, value = click
+                    at.get(kind)[index].set_value(value)
+                self.renders.clear()
+                if trace:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                try:
+                    at.run()
+                    seconds = time.perf_counter() - started
+                    peak = tracemalloc.get_traced_memory()[1] if trace else None
+                finally:
+                    if trace:
+                        tracemalloc.stop()
+                errors = [e.value for e in at.exception] + [e.value for e in at.error]
+                if errors:
+                    raise RuntimeError(f"page step {name!r} failed: {errors[0]}")
+                steps[name] = {
+                    "seconds": seconds,
+                    "peak_bytes": peak,
+                    "payload_bytes": chart_payload(at),
+                    "renders": dict(self.renders),
+                }
+            # Background work (revalidation, pool) must not outlive the data directory
+            st.cache_resource.clear()
+        return steps
+
+
+def chart_payload(at) -> int:
+    """Serialized size of the page's charts, i.e. what goes over the websocket."""
+    return sum(len(element.proto.SerializeToString()) for kind in CHART_ELEMENTS for element in at.get(kind))
+
+
+def bench_page(database, repeat, latency, timeout):
+    runs = [PageRun(database, latency, timeout).run() for _ in range(repeat)]
+    traced = PageRun(database, latency, timeout).run(trace=True)
+    results = {}
+    for name, _ in PAGE_STEPS:
+        seconds = statistics.median(r[name]["seconds"] for r in runs)
+        payload = runs[0][name]["payload_bytes"]
+        results[f"page:{name}"] = {"seconds": seconds, "peak_bytes": traced[name]["peak_bytes"], "payload_bytes": payload}
+        print(f"  {name:<60} {seconds * 1000:9.1f} ms {traced[name]['peak_bytes'] / 2**20:8.1f} MiB {payload / 2**10:9.1f} KiB charts")
+        for fn in sorted(runs[0][name]["renders"]):
+            render_seconds = statistics.median(r[name]["renders"].get(fn, 0.0) for r in runs)
+            results[f"render:{fn}:{name}"] = {"seconds": render_seconds}
+            print(f"    {fn:<58} {render_seconds * 1000:9.1f} ms")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing every measurement that regressed beyond ``tolerance``."""
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if previous is None:
+            continue
+        for field, floor, unit in [("seconds", MIN_SECONDS, "s"), ("peak_bytes", MIN_BYTES, "B"), ("payload_bytes", 0, "B")]:
+            new, old = current.get(field), previous.get(field)
+            if new is None or old is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > floor:
+                regressions.append(f"{key} {field}: {old:.4g}{unit} -> {new:.4g}{unit} (+{(new / old - 1) if old else float('inf'):.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--events", type=int, default=100_000, help="rows in ez_decoded_event_logs (1e4 to 1e8)")
+    parser.add_argument("--days", type=int, default=365, help="days of history")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--database", default=":memory:", help="DuckDB file to generate into (default: in memory)")
+    parser.add_argument("--reuse", action="store_true", help="open --database as is instead of regenerating it")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement (median is reported)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every query, as a warehouse round trip")
+    parser.add_argument("--timeout", type=float, default=600.0, help="seconds a page build may take")
+    parser.add_argument("--skip-queries", action="store_true")
+    parser.add_argument("--skip-page", action="store_true")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown / growth as a fraction")
+    args = parser.parse_args(argv)
+
+    # Query paths in app.py are relative to the repository root
+    os.chdir(ROOT)
+    # The app's deprecation notices would be logged on every build
+    logging.getLogger("streamlit.deprecation_util").disabled = True
+
+    started = time.perf_counter()
+    if args.reuse:
+        database = duckdb.connect(args.database)
+    else:
+        database = generate(args.database, events=args.events, days=args.days, seed=args.seed)
+    print(f"warehouse: {args.events} events over {args.days} days in {time.perf_counter() - started:.1f}s")
+    sizes = table_sizes(database)
+
+    results = {}
+    if not args.skip_queries:
+        print("queries:")
+        results.update(bench_queries(database, args.repeat))
+    if not args.skip_page:
+        print("page:")
+        results.update(bench_page(database, args.repeat, args.latency, args.timeout))
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({
+            "meta": {
+                "created_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+                "events": args.events,
+                "days": args.days,
+                "seed": args.seed,
+                "repeat": args.repeat,
+                "latency": args.latency,
+                "python": sys.version.split()[0],
+                "duckdb": duckdb.__version__,
+                "tables": sizes,
+            },
+            "results": results,
+        }, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline["meta"]["events"] != args.events:
+            print(f"warning: baseline has {baseline['meta']['events']} events, this run {args.events}")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"no regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Just enough of ``snowflake.connector`` to run ``queries/*.sql`` on DuckDB.
+
+``translate`` rewrites the few Snowflake spellings the query files use
+(``decoded_log:amount``, ``value[i]`` and ``value::string`` paths,
+``::string``, ``iff``, ``to_timestamp_ntz`` of microseconds, ``flatten``
+over a JSON bind, ``pyformat`` binds);
+``Connection`` / ``Cursor`` implement the calls ``engine.loader`` and
+``engine.pool`` make, including asynchronous submission by query id,
+and ``write_pandas`` the ``pandas_tools`` upload.
+Each cursor gets its own DuckDB cursor, so concurrent workers do not
+serialize on one connection.
+"""
+import re
+import threading
+import time
+import uuid
+
+import pyarrow as pa
+
+# Query ids outlive sessions, as in Snowflake: any connection can poll them
+_queries = {}
+_queries_lock = threading.Lock()
+_uploads_lock = threading.Lock()
+
+_TRANSLATIONS = [
+    (re.compile(r"\bdecoded_log:(\w+)", re.I), r"decoded_log.\1"),
+    (re.compile(r"\b(\w+)\.value\[(\d+)\]", re.I), r"(\1.value->>\2)"),
+    (re.compile(r"\b(\w+)\.value::string\b", re.I), r"(\1.value->>'$')"),
+    (re.compile(r"::string\b", re.I), "::varchar"),
+    (re.compile(r"\biff\(", re.I), "if("),
+    (re.compile(r"%\((\w+)\)s"), r"$\1"),
+    (re.compile(r"\bto_timestamp_ntz\(([^,()]*(?:\([^()]*\))?[^,()]*), 6\)", re.I), r"make_timestamp(\1)"),
+    # table(flatten(input => parse_json(<bind>))): one row per array element
+    (re.compile(r"\btable\(flatten\(input => parse_json\((\$\w+)\)\)\)", re.I), r"(select unnest(cast(cast(\1 as json) as json[])) as value)"),
+]
+
+
+def translate(sql: str) -> str:
+    for pattern, replacement in _TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class Cursor:
+    def __init__(self, connection):
+        self._connection = connection
+        self._cursor = connection.database.cursor()
+        self.sfqid = None
+
+    def execute(self, sql, params=None):
+        self.sfqid = uuid.uuid4().hex
+        time.sleep(self._connection.latency)
+        self._cursor.execute(translate(sql), params or None)
+        return self
+
+    def execute_async(self, sql, params=None):
+        self.sfqid = self._connection.submit(sql, params)
+        return {"queryId": self.sfqid}
+
+    def get_results_from_sfqid(self, query_id):
+        self._cursor = self._connection.result(query_id)
+        self.sfqid = query_id
+
+    def fetch_arrow_batches(self):
+        for batch in self._cursor.fetch_record_batch():
+            yield pa.Table.from_batches([batch])
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        pass
+
+
+class Connection:
+    """A connector connection over a shared DuckDB database.
+
+    ``latency`` adds a fixed delay to every query, as a rough stand-in
+    for the warehouse round trip.
+    """
+
+    def __init__(self, database, latency=0.0):
+        self.database = database
+        self.latency = latency
+        self._closed = False
+
+    def cursor(self):
+        return Cursor(self)
+
+    def submit(self, sql, params):
+        query_id = uuid.uuid4().hex
+        state = {}
+
+        def run():
+            time.sleep(self.latency)
+            try:
+                cursor = self.database.cursor()
+                cursor.execute(translate(sql), params or None)
+                state["cursor"] = cursor
+            except Exception as e:
+                state["error"] = e
+
+        thread = threading.Thread(target=run, daemon=True)
+        with _queries_lock:
+            _queries[query_id] = (thread, state)
+        thread.start()
+        return query_id
+
+    def result(self, query_id):
+        with _queries_lock:
+            thread, state = _queries.pop(query_id)
+        thread.join()
+        if "error" in state:
+            raise state["error"]
+        return state["cursor"]
+
+    def get_query_status_throw_if_error(self, query_id):
+        with _queries_lock:
+            thread, state = _queries[query_id]
+        if thread.is_alive():
+            return "RUNNING"
+        if "error" in state:
+            raise state["error"]
+        return "SUCCESS"
+
+    @staticmethod
+    def is_still_running(status):
+        return status == "RUNNING"
+
+    def is_valid(self):
+        return not self._closed
+
+    def is_closed(self):
+        return self._closed
+
+    def close(self):
+        self._closed = True
+
+
+def connect(database, latency=0.0):
+    """A ``snowflake.connector.connect`` replacement bound to ``database``."""
+    def factory(*args, **kwargs):
+        return Connection(database, latency)
+    return factory
+
+
+def write_pandas(conn, df, table_name, **kwargs):
+    """``pandas_tools.write_pandas``, as a plain table of the shared database.
+
+    DuckDB temporary tables belong to one cursor and the query runs on
+    another, so uploads replace an ordinary table of the same name, one
+    at a time (concurrent replaces of a table conflict in DuckDB).
+    """
+    cursor = conn.database.cursor()
+    try:
+        with _uploads_lock:
+            cursor.register("upload", df)
+            cursor.execute(f"create or replace table {table_name} as select * from upload")
+    finally:
+        cursor.close()
+    return True, 1, len(df), []
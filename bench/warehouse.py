@@ -0,0 +1,203 @@
+"""Synthetic stand-in for the Ink warehouse, generated inside DuckDB.
+
+Every table the dashboard's queries read is created under the same
+catalog / schema / table names as on Flipside (``ink.core``,
+``ink.price``, ``bridge_activity.defi``, ``<chain>.balances``, ...).
+Rows are derived from ``range()`` with hash-based pseudo-random values,
+so generation stays in DuckDB (no Python-side rows) and scales from 10^4
+to 10^8 events; the same seed always yields the same warehouse.
+"""
+import datetime as dt
+
+import duckdb
+
+POOL = '0x2816cf15f6d2a220e789aa011d5ee4eb6c47feba'
+WETH_GATEWAY = '0xde090efcd6ef4b86792e2d84e55a5fa8d49d25d2'
+POSITION_MANAGER = '0x991d5546c4b442b4c5fdc4c8b8b8d131deb24702'
+KBTC = '0x73e0c0d45e048d25fc26fa3159b0aa04bfa4db98'
+WBTC_ETHEREUM = '0x2260fac5e5542a773aa44fbcfedf7c193bc2c599'
+
+# address -> (symbol, decimals, price in USD)
+TOKENS = {
+    '0x5bad2bd4b8e3a3bd0ab9fbd39bb1e7bbae9f4b4c': ('GHO', 18, 1.0),
+    '0xe343167631d89b6ffc58b88d6b7fb0228795491d': ('USDG', 6, 1.0),
+    '0x0200c29006150606b650577bbe7b6248f58470c1': ('USD₮0', 6, 1.0),
+    KBTC: ('kBTC', 8, 60_000.0),
+    '0x4200000000000000000000000000000000000006': ('WETH', 18, 3_000.0),
+}
+
+CHAINS = ['optimism', 'ethereum', 'arbitrum', 'bsc', 'base', 'avalanche']
+EXCHANGES = ['binance', 'okx', 'kraken', 'bybit', 'coinbase', 'gate']
+BRIDGED_SYMBOLS = ['GHO', 'USDG', 'WETH', 'USD₮0', 'USDT', 'ETH', 'kBTC', 'DOGE']
+EVENT_NAMES = ['Supply', 'Withdraw', 'Borrow', 'Repay', 'Approval', 'Transfer']
+
+# Addresses holding balances on every chain (and pools on Ink)
+HOLDERS = 200
+LP_POOLS = 30
+
+
+def generate(database=':memory:', events=100_000, days=365, seed=0, end=None) -> duckdb.DuckDBPyConnection:
+    """Create (or overwrite) the synthetic warehouse in ``database``.
+
+    Bridge transfers and token transfers are ``events / 4`` rows each;
+    users number ``events / 20``. Data ends at ``end`` (default: now, UTC).
+    """
+    con = duckdb.connect(database)
+    end = end or dt.datetime.now(dt.timezone.utc).replace(tzinfo=None, microsecond=0)
+    start = end - dt.timedelta(days=days)
+    users = max(50, events // 20)
+
+    for catalog in ['ink', 'crosschain', 'bridge_activity'] + CHAINS:
+        if database == ':memory:':
+            con.execute(f"attach ':memory:' as {catalog}")
+        else:
+            con.execute(f"attach '{database}.{catalog}' as {catalog}")
+    for schema in ['ink.core', 'ink.price', 'ink.balances', 'crosschain.price', 'bridge_activity.defi'] + [f'{c}.balances' for c in CHAINS]:
+        con.execute(f'create schema if not exists {schema}')
+
+    # Uniform (0, 1) and standard normal draws keyed by row number and a salt
+    con.execute(f"create or replace macro u(i, salt) as ((hash(i, salt, {seed}) % 4294967291)::double + 0.5) / 4294967291.0")
+    con.execute("create or replace macro z(i, salt) as sqrt(-2 * ln(u(i, salt || '1'))) * cos(2 * pi() * u(i, salt || '2'))")
+    con.execute("create or replace macro address(prefix, n) as prefix || lpad(printf('%x', n), (42 - length(prefix))::int, '0')")
+
+    con.execute('create or replace temp table tokens (address varchar, symbol varchar, decimals int, price double, k int)')
+    con.executemany(
+        'insert into tokens values (?, ?, ?, ?, ?)',
+        [(a, s, d, p, k) for k, (a, (s, d, p)) in enumerate(TOKENS.items())],
+    )
+
+    span = (end - start).total_seconds()
+    con.execute(f"""
+        create or replace table ink.core.ez_decoded_event_logs as
+        with draws as (
+            select
+                i,
+                timestamp '{start}' + to_microseconds(((i + u(i, 'ts')) * {span} / {events} * 1e6)::bigint) as block_timestamp,
+                u(i, 'gateway') < 0.2 as via_gateway,
+                floor(u(i, 'token') * {len(TOKENS)})::int as k,
+                exp(7 + 2 * z(i, 'amount')) as amount_usd,
+                u(i, 'event') as event_draw,
+                u(i, 'target') as target_draw
+            from range({events}) t(i)
+        )
+        select
+            printf('0x%064x', i) as tx_hash,
+            block_timestamp,
+            i + 1 as block_number,
+            address('0xuser', hash(i, 'user', {seed}) % {users}) as origin_from_address,
+            case
+                when via_gateway then '{WETH_GATEWAY}'
+                when target_draw < 0.85 then '{POOL}'
+                else '{POSITION_MANAGER}'
+            end as origin_to_address,
+            case
+                when event_draw < 0.03 then 'IncreaseLiquidity'
+                else {EVENT_NAMES}[1 + floor(u(i, 'name') * {len(EVENT_NAMES)})::int]
+            end as event_name,
+            {{
+                'amount': amount_usd / tokens.price * pow(10, case when via_gateway then 18 else tokens.decimals end),
+                'reserve': tokens.address
+            }} as decoded_log,
+            u(i, 'ok') < 0.97 as tx_succeeded
+        from draws
+        join tokens using (k)
+    """)
+
+    con.execute('create or replace table ink.core.dim_contracts as select address, symbol, decimals from tokens')
+
+    con.execute(f"""
+        create or replace table ink.price.ez_prices_hourly as
+        select
+            hour,
+            address as token_address,
+            price * (0.95 + 0.1 * u(epoch(hour)::bigint, address)) as price
+        from range(timestamp '{start.date() - dt.timedelta(days=5)}', timestamp '{end.date() + dt.timedelta(days=1)}', interval 1 hour) h(hour)
+        cross join tokens
+    """)
+    con.execute(f"""
+        create or replace table crosschain.price.ez_prices_hourly as
+        select hour, '{WBTC_ETHEREUM}' as token_address, 'ethereum' as blockchain, price
+        from ink.price.ez_prices_hourly
+        where token_address = '{KBTC}'
+    """)
+
+    transfers = max(1, events // 4)
+    con.execute(f"""
+        create or replace table bridge_activity.defi.ez_bridge_activity as
+        with draws as (
+            select i, u(i, 'inflow') < 0.5 as inflow, {CHAINS}[1 + floor(u(i, 'chain') * {len(CHAINS)})::int] as other
+            from range({transfers}) t(i)
+        )
+        select
+            timestamp '{start}' + to_microseconds((u(i, 'bts') * {span} * 1e6)::bigint) as block_timestamp,
+            printf('0xb%063x', i) as tx_hash,
+            case when inflow then other else 'ink' end as source_chain,
+            case when inflow then 'ink' else other end as destination_chain,
+            {BRIDGED_SYMBOLS}[1 + floor(u(i, 'symbol') * {len(BRIDGED_SYMBOLS)})::int] as token_symbol,
+            exp(7 + 2 * z(i, 'busd')) as amount_usd,
+            address('0xuser', hash(i, 'src', {seed}) % {users}) as source_address,
+            address('0xuser', hash(i, 'dst', {seed}) % {users}) as destination_address
+        from draws
+    """)
+
+    con.execute('create or replace table ink.core.dim_labels (address varchar, label_type varchar, label varchar)')
+    con.executemany(
+        'insert into ink.core.dim_labels values (?, ?, ?)',
+        [(f'0xcex{k:037x}', 'cex', name) for k, name in enumerate(EXCHANGES)] + [('0xdex' + '0' * 37, 'dex', 'uniswap')],
+    )
+
+    con.execute(f"""
+        create or replace table ink.core.ez_token_transfers as
+        select
+            timestamp '{start}' + to_microseconds((u(i, 'tts') * {span} * 1e6)::bigint) as block_timestamp,
+            hash(i, 'block', {seed}) % {events} + 1 as block_number,
+            -- Transfers share transactions with the event logs (e.g. IncreaseLiquidity)
+            printf('0x%064x', hash(i, 'ttx', {seed}) % {events}) as tx_hash,
+            case
+                when u(i, 'from') < 0.3 then printf('0xcex%037x', floor(u(i, 'cex') * {len(EXCHANGES)})::int)
+                else address('0xuser', hash(i, 'tfrom', {seed}) % {users})
+            end as from_address,
+            address('0xpool', hash(i, 'to', {seed}) % {LP_POOLS}) as to_address,
+            address('0xuser', hash(i, 'ofrom', {seed}) % {users}) as origin_from_address,
+            case when u(i, 'oto') < 0.5 then '{POSITION_MANAGER}' else '{POOL}' end as origin_to_address,
+            tokens.address as contract_address,
+            exp(6 + 2 * z(i, 'tusd')) as amount_usd
+        from range({transfers}) t(i)
+        join tokens on tokens.k = floor(u(i, 'ttoken') * {len(TOKENS)})::int
+    """)
+    con.execute('create or replace table ink.core.ez_native_transfers as select * exclude (contract_address) from ink.core.ez_token_transfers')
+
+    for catalog in ['ink'] + CHAINS:
+        holders = f"address('0xpool', n) as holder from range({LP_POOLS}) a(n)" if catalog == 'ink' else f"address('0xuser', n) as holder from range({min(HOLDERS, users)}) a(n)"
+        con.execute(f"""
+            create or replace table {catalog}.balances.ez_balances_erc20_daily as
+            with holders as (select {holders})
+            select
+                block_date::date as block_date,
+                holder as address,
+                tokens.address as contract_address,
+                tokens.symbol,
+                exp(3 + 2 * z(hash(block_date, holder, tokens.address), '{catalog}')) as balance,
+                balance * tokens.price * (0.5 + 1.5 * u(hash(block_date, holder, tokens.address), 'usd')) as balance_usd
+            from range(timestamp '{end.date() - dt.timedelta(days=5)}', timestamp '{end.date()}', interval 1 day) d(block_date)
+            cross join holders
+            cross join tokens
+        """)
+        con.execute(f"""
+            create or replace table {catalog}.balances.ez_balances_native_daily as
+            select block_date, address, 'ETH' as symbol, balance, balance_usd
+            from {catalog}.balances.ez_balances_erc20_daily
+            where symbol = 'WETH'
+        """)
+
+    return con
+
+
+def table_sizes(con) -> dict:
+    rows = con.execute("""
+        select database_name || '.' || schema_name || '.' || table_name, estimated_size
+        from duckdb_tables()
+        where not temporary
+        order by 1
+    """).fetchall()
+    return dict(rows)
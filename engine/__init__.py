@@ -0,0 +1 @@
+"""Query execution and caching layer behind the Tydro dashboard."""
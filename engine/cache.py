@@ -0,0 +1,97 @@
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def result_size(value) -> int:
+    """Bytes held by a result; ``deep`` counts the Python strings in object columns too."""
+    try:
+        return max(int(value.memory_usage(index=True, deep=True).sum()), 1)
+    except AttributeError:
+        return sys.getsizeof(value)
+
+
+class ResultCache:
+    """Thread-safe LRU cache for query results with per-query TTLs.
+
+    Entries are evicted least-recently-used first once either
+    ``max_entries`` or ``max_bytes`` (summed ``result_size``, the frames'
+    real memory footprint) is exceeded.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=512 << 20, default_ttl=600.0, ttls=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, size, value)
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def ttl_for(self, query_name) -> float:
+        return self.ttls.get(query_name, self.default_ttl)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at <= self._clock():
+                self._drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, query_name=None, ttl=None):
+        if ttl is None:
+            ttl = self.ttl_for(query_name)
+        size = result_size(value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (self._clock() + ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
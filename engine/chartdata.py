@@ -0,0 +1,100 @@
+"""Compact data for the over-time charts.
+
+Streamlit sends each chart's data to the browser inside that chart's own
+element, and Altair serializes every column of the frame it is given.
+``chart_frame`` cuts a frame down to the columns a chart encodes and, when
+a line has more points than the chart has pixels, downsamples it with
+Largest-Triangle-Three-Buckets, which keeps the peaks and troughs a line
+of that width could show.
+
+Bars are not thinned that way: a dropped bar is a day of counts gone from
+the chart. ``coarsen`` instead moves bar charts to the next coarser period
+(weeks, then months), whose bars add the days up, with distinct users
+merged from their sketches rather than summed.
+"""
+import numpy as np
+import pandas as pd
+
+# About the pixel width of a chart in one third of a wide page
+MAX_POINTS = 400
+
+# Periods bars can be bucketed into, finest first
+BAR_PERIODS = ["day", "week", "month"]
+
+
+def lttb_indices(x, y, threshold: int) -> np.ndarray:
+    """Positions of the ``threshold`` points LTTB keeps from ``x``-sorted ``(x, y)``."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = _numeric(x)
+    y = np.asarray(y, dtype=float)
+
+    # First and last points are always kept; the rest is split into
+    # threshold - 2 buckets that each contribute one point
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Pick the point spanning the largest triangle with the previous pick
+        # and the next bucket's average
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def downsample(frame: pd.DataFrame, x: str, y: str, by=None, max_points=MAX_POINTS) -> pd.DataFrame:
+    """At most ``max_points`` rows per ``by`` series, chosen by LTTB on ``y``."""
+    if by is None:
+        return _downsample_series(frame, x, y, max_points)
+    if frame.empty or frame.groupby(by, observed=True).size().max() <= max_points:
+        return frame
+    return pd.concat(
+        [_downsample_series(series, x, y, max_points) for _, series in frame.groupby(by, sort=False, observed=True)]
+    ).sort_index()
+
+
+def chart_frame(frame: pd.DataFrame, x: str, y: str, by=None, tooltip=(), max_points=MAX_POINTS) -> pd.DataFrame:
+    """Only the columns a chart encodes, downsampled to ``max_points`` per series.
+
+    With ``max_points=None`` (bar charts, see ``coarsen``) nothing is dropped.
+    """
+    columns = [x] + ([by] if by else []) + [y] + [c for c in tooltip if c not in (x, by, y)]
+    if max_points is None:
+        return frame[columns]
+    return downsample(frame[columns], x, y, by=by, max_points=max_points)
+
+
+def coarsen(rollup, period: str, x: str = "date", max_points=MAX_POINTS):
+    """``(rollup(p), p)`` for the finest period ``p`` from ``period`` on with at most ``max_points`` bars.
+
+    ``rollup(period)`` returns the per-period frame; the coarsest period is
+    used as is, however many bars it has.
+    """
+    frame = rollup(period)
+    for coarser in BAR_PERIODS[BAR_PERIODS.index(period) + 1:]:
+        if frame[x].nunique() <= max_points:
+            break
+        frame, period = rollup(coarser), coarser
+    return frame, period
+
+
+def _downsample_series(series, x, y, max_points):
+    if len(series) <= max_points:
+        return series
+    series = series.sort_values(x)
+    return series.iloc[lttb_indices(series[x], series[y], max_points)]
+
+
+def _numeric(values) -> np.ndarray:
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[ns]').astype(np.int64).astype(float)
+    return values.astype(float)
@@ -0,0 +1,33 @@
+"""Bridge and CEX flow aggregates computed locally from daily query results.
+
+The flow queries return one row per day (and direction / chain / token or
+exchange), fetched once for all history; the range selector only changes
+which days are summed here.
+"""
+import numpy as np
+import pandas as pd
+
+# Distinct transactions do not add up across days or chains / tokens (one
+# transaction can bridge several tokens), so the totals count transfers
+FLOW_COLUMNS = ['transfers', 'volume_usd', 'priced_transfers']
+
+
+def bridge_flows(daily: pd.DataFrame, by: str) -> pd.DataFrame:
+    """Per (direction, ``by``) bridge transfers, volume and average priced amount."""
+    flows = daily.groupby(['direction', by], observed=True)[FLOW_COLUMNS].sum(min_count=1)
+    flows['average_amount_usd'] = flows['volume_usd'] / flows['priced_transfers'].replace(0, np.nan)
+    return flows.reset_index()[['direction', by, 'transfers', 'volume_usd', 'average_amount_usd']]
+
+
+def cex_inflows(daily: pd.DataFrame) -> pd.DataFrame:
+    return daily.groupby('label', as_index=False, observed=True)['volume_usd'].sum(min_count=1)
+
+
+def retained_in_ink(borrowed_usd: float, bridged_out: pd.DataFrame) -> dict:
+    bridged_out_usd = bridged_out['total_bridged_out'].sum()
+    total = borrowed_usd + bridged_out_usd
+    return {
+        'total_borrowed_within_ink': borrowed_usd,
+        'total_bridged_out': bridged_out_usd,
+        'percentage_retained_in_ink': borrowed_usd / total * 100 if total else np.nan,
+    }
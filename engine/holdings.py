@@ -0,0 +1,35 @@
+"""Cross-chain holdings of Tydro users, assembled from per-chain results.
+
+Each chain has its own query (latest ERC20 and native balances per user,
+summed by token), so chains are fetched concurrently and cached on their
+own schedules; the by-chain and by-asset views are sums over whichever
+chains have arrived.
+"""
+import pandas as pd
+
+from engine.schema import concat_frames
+
+HOLDINGS_COLUMNS = ['chain', 'symbol', 'token_address', 'balance_usd']
+
+
+def combine_chains(frames) -> pd.DataFrame:
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=HOLDINGS_COLUMNS)
+    return concat_frames(frames)
+
+
+def holdings_by_chain(holdings: pd.DataFrame) -> pd.DataFrame:
+    return (
+        holdings.groupby('chain', as_index=False, observed=True)['balance_usd'].sum()
+        .sort_values('balance_usd', ascending=False, ignore_index=True)
+    )
+
+
+def holdings_by_asset(holdings: pd.DataFrame, limit=20) -> pd.DataFrame:
+    # Native balances have no token address; they still group (across chains) by symbol
+    return (
+        holdings.groupby(['symbol', 'token_address'], as_index=False, dropna=False, observed=True)['balance_usd'].sum()
+        .sort_values('balance_usd', ascending=False, ignore_index=True)
+        .head(limit)
+    )
@@ -0,0 +1,254 @@
+"""Incrementally refreshed local copy of a timestamped query result.
+
+Days before the high-water mark are complete: they are persisted as
+monthly Parquet partitions and never queried again. Each refresh asks the
+warehouse only for rows on or after the watermark and replaces that tail,
+so the cost of a refresh grows with new data rather than total history.
+
+Several processes may share the directory (the page and the precompute
+job): one whose copy is out of date first picks up a newer refresh from
+disk before going to the warehouse itself.
+
+Once there is anything to serve, an out-of-date extract is still served
+as is and its tail is refreshed on ``background`` (stale-while-revalidate);
+a failed refresh is logged and the rows already held keep being served.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from engine.schema import concat_frames
+from engine.templates import TimeRange
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalExtract:
+    def __init__(self, directory, timestamp_column="block_timestamp", lookback_days=1, max_age=600.0, background=None, clock=time.time):
+        self.directory = Path(directory)
+        self.timestamp_column = timestamp_column
+        # Late-arriving rows can still land on the last completed day(s)
+        self.lookback_days = lookback_days
+        self.max_age = max_age
+        self.background = background
+        self._clock = clock
+        # _lock guards the state readers see; _refresh_lock keeps refreshes
+        # one at a time without holding readers up while the warehouse runs
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._frame = None
+        self._derived = {}
+        self._updates = {}
+        self._revisions = {}
+        self._inputs = {}
+        # One build per derived value at a time, outside _lock
+        self._building = {}
+        self.watermark = None
+        self.refreshed_at = 0.0
+        # refreshed_at of the refresh the rows in memory came from
+        self._persisted_at = 0.0
+        self._load()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / "manifest.json"
+
+    def get(self, fetch) -> pd.DataFrame:
+        """Return the full extract, refreshing the open tail when it is older than ``max_age``.
+
+        ``fetch(time_range)`` must run the underlying query for ``time_range``.
+        Only the very first fill waits for it; afterwards the rows held are
+        returned and the refresh runs on ``background`` (or, without one,
+        here, falling back to those rows if it fails).
+        """
+        with self._lock:
+            if self._fresh():
+                return self._frame
+            frame = self._frame
+        if frame is None:
+            return self._refresh(fetch)
+        if self.background is None:
+            try:
+                return self._refresh(fetch)
+            except Exception:
+                logger.exception("Refreshing %s failed; serving the rows held", self.directory)
+                return frame
+        self._revalidate(fetch)
+        return frame
+
+    def refresh(self, fetch) -> pd.DataFrame:
+        """Refresh the open tail now, however recently it was refreshed."""
+        return self._refresh(fetch, force=True)
+
+    def _fresh(self) -> bool:
+        # With _lock held: rows within max_age, in memory or from another process
+        if self._frame is not None and self._clock() - self.refreshed_at < self.max_age:
+            return True
+        return self._reload()
+
+    def _refresh(self, fetch, force=False):
+        with self._refresh_lock:
+            with self._lock:
+                # A refresh that held the lock before this one may have done the work
+                if not force and self._fresh():
+                    return self._frame
+                watermark = self.watermark
+            delta = fetch(TimeRange(watermark))
+            with self._lock:
+                self._apply(delta, watermark)
+                return self._frame
+
+    def _revalidate(self, fetch):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                self._refresh(fetch)
+            except Exception:
+                logger.exception("Background refresh of %s failed", self.directory)
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        self.background.submit(refresh)
+
+    def derived(self, name, build, update=None, inputs=(), revise=None):
+        """Return ``build(frame)`` for the current extract, computed once per refresh.
+
+        With ``update``, a refresh does not rebuild the value: it passes the
+        previous value and the rows it just fetched to ``update(value, rows)``.
+        Those rows may include ones already seen (the re-fetched tail).
+
+        ``inputs`` are the other objects ``build`` reads (e.g. reference
+        tables); the value is also rebuilt when any of them is a different
+        object than at the last build.
+
+        With ``revise``, neither rebuilds it: ``revise(value, frame, since)``
+        returns the value for ``frame`` and the current inputs from the
+        previous one, where the rows on or after the day ``since`` are the
+        ones a refresh replaced (``None`` when only the inputs changed).
+
+        Values are built (and revised for new inputs) without holding up
+        readers or refreshes; one built from rows that were refreshed in
+        the meantime is returned but not kept.
+        """
+        inputs = tuple(inputs)
+        with self._lock:
+            if self._current(name, inputs):
+                return self._derived[name]
+            building = self._building.setdefault(name, threading.Lock())
+        with building:
+            with self._lock:
+                if self._current(name, inputs):
+                    return self._derived[name]
+                frame = self._frame
+                revisable = revise is not None and name in self._derived
+                previous = self._derived.get(name)
+            value = revise(previous, frame, None) if revisable else build(frame)
+            with self._lock:
+                if self._frame is frame:
+                    self._derived[name] = value
+                    self._inputs[name] = inputs
+                    for hooks, hook in [(self._updates, update), (self._revisions, revise)]:
+                        if hook is None:
+                            hooks.pop(name, None)
+                        else:
+                            hooks[name] = hook
+            return value
+
+    def _current(self, name, inputs) -> bool:
+        # With _lock held: whether the value held for ``name`` was built from ``inputs``
+        held = self._inputs.get(name, ())
+        return name in self._derived and len(held) == len(inputs) and all(a is b for a, b in zip(held, inputs))
+
+    def _apply(self, delta, watermark):
+        # ``delta`` holds every row on or after ``watermark``, the watermark it
+        # was fetched from; the frame may have been reloaded from disk since
+        ts = self.timestamp_column
+        delta = delta.sort_values(ts, kind="stable")
+
+        if self._frame is None or watermark is None:
+            frame = delta.reset_index(drop=True)
+            touched = frame
+        else:
+            cutoff = pd.Timestamp(watermark)
+            kept = self._frame[self._frame[ts] < cutoff]
+            frame = concat_frames([kept, delta])
+            # Months whose partition content changed: the one holding the old
+            # watermark and anything the new rows reach into
+            touched = frame[frame[ts] >= cutoff.to_period("M").start_time]
+
+        self._write_partitions(touched)
+        if not frame.empty:
+            last_day = frame[ts].max().normalize()
+            self.watermark = (last_day - pd.Timedelta(days=self.lookback_days)).date()
+        self._frame = frame
+        derived = {}
+        for name, value in self._derived.items():
+            if name in self._revisions and watermark is not None:
+                derived[name] = self._revisions[name](value, frame, watermark)
+            elif name in self._updates:
+                derived[name] = self._updates[name](value, delta)
+        self._derived = derived
+        self.refreshed_at = self._clock()
+        self._write_manifest(len(frame))
+        self._persisted_at = self.refreshed_at
+
+    def _write_partitions(self, frame):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        months = frame[self.timestamp_column].dt.to_period("M")
+        for month, part in frame.groupby(months, sort=True):
+            # Readers in other processes only ever see whole partitions
+            tmp = self.directory / f"{month}.{os.getpid()}.tmp"
+            part.to_parquet(tmp, index=False)
+            tmp.replace(self.directory / f"{month}.parquet")
+
+    def _write_manifest(self, rows):
+        manifest = {
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "refreshed_at": self.refreshed_at,
+            "rows": rows,
+        }
+        tmp = self.manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(manifest))
+        tmp.replace(self.manifest_path)
+
+    def _reload(self) -> bool:
+        """Load the persisted extract if another process refreshed it within ``max_age``."""
+        try:
+            manifest = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return False
+        refreshed_at = manifest.get("refreshed_at", 0.0)
+        if self._clock() - refreshed_at >= self.max_age:
+            return False
+        if refreshed_at > self._persisted_at:
+            if not self._load():
+                return False
+            # Derived values cannot be updated without the rows that changed
+            self._derived = {}
+        self.refreshed_at = refreshed_at
+        return True
+
+    def _load(self) -> bool:
+        if not self.manifest_path.exists():
+            return False
+        manifest = json.loads(self.manifest_path.read_text())
+        parts = sorted(self.directory.glob("*.parquet"))
+        if manifest.get("watermark") is None or not parts:
+            return False
+        self._frame = concat_frames(pd.read_parquet(p) for p in parts)
+        self.watermark = pd.Timestamp(manifest["watermark"]).date()
+        self._persisted_at = manifest.get("refreshed_at", 0.0)
+        # Only the tail since the persisted watermark is fetched on first use
+        self.refreshed_at = 0.0
+        return True
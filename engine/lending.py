@@ -0,0 +1,57 @@
+"""Lending aggregates computed locally from the shared Tydro events extract.
+
+The extract holds one priced row per Supply / Withdraw / Borrow / Repay
+event (``queries/tydro-events.sql``, valued by ``engine.reference``);
+every lending chart is derived from that frame here instead of
+re-scanning the event logs in its own query.
+"""
+import numpy as np
+import pandas as pd
+
+EVENT_COLUMNS = ['tx_hash', 'block_timestamp', 'user', 'amount', 'token_address', 'symbol', 'event_name', 'amount_usd']
+
+# Same buckets (and labels) as the CASE expression the deposit query used to run
+DEPOSIT_BUCKET_EDGES = [-np.inf, 1_000, 25_000, 100_000, 1_000_000, np.inf]
+DEPOSIT_BUCKET_LABELS = ['<1K', '1–25K', '25–100K', '100K–1M+', '1M+']
+
+
+def lending_totals(events: pd.DataFrame, event_name: str) -> dict:
+    selected = events[events['event_name'] == event_name]
+    amount_usd = selected['amount_usd']
+    return {
+        'transactions': selected['tx_hash'].nunique(),
+        'users': selected['user'].nunique(),
+        'volume_usd': amount_usd.sum(),
+        'average_amount_usd': amount_usd.mean(),
+        'median_amount_usd': amount_usd.median(),
+        'max_amount_usd': amount_usd.max(),
+    }
+
+
+def deposit_size_distribution(events: pd.DataFrame) -> pd.DataFrame:
+    supplies = events[events['event_name'] == 'Supply']
+    buckets = pd.cut(
+        supplies['amount_usd'],
+        bins=DEPOSIT_BUCKET_EDGES,
+        labels=DEPOSIT_BUCKET_LABELS,
+        right=False,
+    )
+    return (
+        supplies.groupby(buckets, observed=True)['amount_usd']
+        .agg(deposit_count='size', total_deposit_usd='sum', min_amount_usd='min', max_amount_usd='max')
+        .rename_axis('deposit_size_range')
+        .reset_index()
+    )
+
+
+def inflows_outflows_by_token(events: pd.DataFrame) -> pd.DataFrame:
+    flows = events[events['event_name'].isin(['Supply', 'Withdraw'])]
+    return (
+        flows.groupby(['event_name', 'symbol'], as_index=False, dropna=False, observed=True)
+        .agg(
+            volume=('amount', 'sum'),
+            volume_usd=('amount_usd', 'sum'),
+            average_amount=('amount', 'mean'),
+            average_amount_usd=('amount_usd', 'mean'),
+        )
+    )
@@ -0,0 +1,399 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+import pandas as pd
+
+from snowflake.connector import pandas_tools
+from snowflake.connector.errors import NotSupportedError
+
+from engine.metrics import annotate
+from engine.registry import default_registry
+from engine.schema import arrow_to_frame, empty_frame, rows_to_frame
+from engine.templates import render
+
+logger = logging.getLogger(__name__)
+
+
+def read_sql(file_path: str) -> str:
+    return default_registry().get(file_path).text
+
+
+def empty_result(file_path: str):
+    return empty_frame(default_registry().schema(file_path))
+
+
+def fetch_frame(cursor, schema):
+    fetched = {"bytes": 0, "seconds": 0.0}
+
+    def counted(batches):
+        # Download time and size, kept apart from the DataFrame build around it
+        while True:
+            started = time.perf_counter()
+            batch = next(batches, None)
+            fetched["seconds"] += time.perf_counter() - started
+            if batch is None:
+                return
+            fetched["bytes"] += batch.nbytes
+            yield batch
+
+    started = time.perf_counter()
+    try:
+        frame = arrow_to_frame(counted(iter(cursor.fetch_arrow_batches())), schema)
+    except NotSupportedError:
+        # Result came back in JSON format (e.g. for very small results)
+        frame = rows_to_frame(cursor.fetchall(), schema)
+        fetched["bytes"] = int(frame.memory_usage(deep=True).sum())
+    annotate(
+        rows=len(frame),
+        bytes=fetched["bytes"],
+        build_time=time.perf_counter() - started - fetched["seconds"],
+    )
+    return frame
+
+
+def table_digest(frame: pd.DataFrame) -> str:
+    """Digest of an uploaded table's content; its temporary table is named after it."""
+    rows = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    return hashlib.sha256(",".join(frame.columns).encode("utf-8") + rows.tobytes()).hexdigest()[:16]
+
+
+def versioned_tables(tables, digest=table_digest) -> dict:
+    """``{name: frame}`` -> ``{name: (temporary table name, frame)}``, named by content."""
+    return {name.lower(): (f"{name.lower()}_{digest(frame)}", frame) for name, frame in (tables or {}).items()}
+
+
+def rename_tables(sql_query: str, names: dict) -> str:
+    """``sql_query`` reading the tables ``names`` maps the declared names to."""
+    if not names:
+        return sql_query
+    pattern = re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b", re.IGNORECASE)
+    return pattern.sub(lambda m: names[m.group(1).lower()], sql_query)
+
+
+def upload_tables(conn, tables):
+    """Create the session's temporary tables ``{name: frame}``.
+
+    Large local inputs (user lists, touch tables) go to the warehouse this
+    way rather than as binds, which pyformat inlines into the statement
+    text and Snowflake caps at about 1MB. The tables live in the
+    session's current database and schema until the session ends.
+    """
+    for name, frame in (tables or {}).items():
+        pandas_tools.write_pandas(
+            conn,
+            frame,
+            name,
+            auto_create_table=True,
+            overwrite=True,
+            table_type="temporary",
+            quote_identifiers=False,
+            use_logical_type=True,
+        )
+
+
+def drop_tables(conn, names):
+    cursor = conn.cursor()
+    try:
+        for name in names:
+            cursor.execute(f"drop table if exists {name}")
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+def execute_query(conn, sql_query: str, params, schema):
+    cursor = conn.cursor()
+    try:
+        started = time.perf_counter()
+        cursor.execute(sql_query, params)
+        annotate(query_id=cursor.sfqid, execution_time=time.perf_counter() - started)
+        return fetch_frame(cursor, schema)
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+def submit_query(conn, sql_query: str, params) -> str:
+    """Start ``sql_query`` without waiting for it; returns the warehouse query id."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute_async(sql_query, params)
+        annotate(query_id=cursor.sfqid)
+        return cursor.sfqid
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+def query_running(conn, query_id: str) -> bool:
+    # Raises the query's own error once it has failed
+    return conn.is_still_running(conn.get_query_status_throw_if_error(query_id))
+
+
+def fetch_query_result(conn, query_id: str, schema):
+    cursor = conn.cursor()
+    try:
+        cursor.get_results_from_sfqid(query_id)
+        return fetch_frame(cursor, schema)
+    finally:
+        try:
+            cursor.close()
+        except Exception:
+            pass
+
+
+def describe_params(cache_key) -> dict:
+    # The parameters that actually shaped the result, as recorded in the cache key
+    condition, period = cache_key[1:3]
+    return {
+        "start_date": condition.start.isoformat() if condition and condition.start else None,
+        "period": period,
+    }
+
+
+class QueryLoader:
+    """Runs query files through the memory cache, the on-disk store and the warehouse.
+
+    A stored snapshot that is past its staleness threshold is still returned
+    immediately; a refresh is queued on ``background`` (stale-while-revalidate).
+    All methods are safe to call from worker threads: failures are raised,
+    not rendered.
+
+    With ``poll_interval`` set, queries are submitted asynchronously and
+    polled by query id (backing off up to ``max_poll_interval`` seconds),
+    so no warehouse session is held while a query runs.
+
+    Warehouse runs are single-flight per cache key: a request for a result
+    that is already being fetched (by any session of the process) waits
+    for that run and shares its result. ``executions`` counts warehouse
+    runs, ``coalesced`` the runs saved that way.
+    """
+
+    def __init__(self, pool, cache, store=None, background=None, poll_interval=None, max_poll_interval=2.0, registry=None):
+        self.pool = pool
+        self.cache = cache
+        self.store = store
+        self.background = background
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.registry = registry or default_registry()
+        self._refreshing = set()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        # Per session: its temporary tables (name -> declared name), oldest first
+        self._sessions = weakref.WeakKeyDictionary()
+        self._upload_locks = {}
+        # id(frame) -> (frame, digest) of recently uploaded tables, newest last
+        self._digests = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    def load(self, file_path: str, condition, period: str, use_store=True, binds=None, tables=None, refresh=False):
+        """Return the file's result for ``condition``/``period`` as a typed DataFrame.
+
+        ``binds()`` supplies extra bind parameters and is only called when the
+        warehouse is queried; it is not part of the cache key, so the binds
+        must follow from ``condition``/``period`` and the data itself.
+        ``tables()`` supplies the temporary tables (``{name: frame}``)
+        uploaded to the query's session first. It is called on every load,
+        as the tables' content is part of the cache key. ``refresh``
+        skips the memory cache and the store and always queries the warehouse.
+        """
+        query = self.registry.get(file_path)
+        cache_key, uploads = self._cache_key(query, condition, period, tables)
+        if not refresh:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                annotate(cache="memory")
+                return cached
+
+            if use_store and self.store is not None:
+                stored = self.store.get(cache_key)
+                if stored is not None:
+                    frame, age = stored
+                    self.cache.put(cache_key, frame, query_name=file_path)
+                    if self.store.is_stale(file_path, age):
+                        annotate(cache="stale")
+                        self._revalidate(query, cache_key, condition, period, binds, uploads)
+                    else:
+                        annotate(cache="store")
+                    return frame
+
+        def fetch():
+            if not refresh:
+                # A run for this key may have finished since the lookup above
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    annotate(cache="memory")
+                    return cached
+            # Binds may load other results first; this query's outcome is set after
+            extra = binds() if binds is not None else None
+            annotate(cache="miss")
+            return self._fetch(query, cache_key, condition, period, use_store, extra, uploads)
+
+        return self._single_flight(cache_key, fetch)
+
+    def cache_key(self, file_path: str, condition, period: str, tables=None):
+        """The key ``load`` caches ``file_path``'s result under, given the same arguments."""
+        return self._cache_key(self.registry.get(file_path), condition, period, tables)[0]
+
+    def _cache_key(self, query, condition, period, tables=None):
+        uploads = versioned_tables(tables(), self._table_digest) if tables is not None else {}
+        return query.cache_key(condition, period, [name for name, _ in uploads.values()]), uploads
+
+    def _single_flight(self, cache_key, fetch):
+        """``fetch()``, unless a run for ``cache_key`` is in flight: then that run's result."""
+        with self._lock:
+            future = self._in_flight.get(cache_key)
+            leader = future is None
+            if leader:
+                future = self._in_flight[cache_key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            annotate(cache="coalesced")
+            return future.result()
+        try:
+            result = fetch()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[cache_key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._in_flight)}
+
+    def _table_digest(self, frame):
+        # Tables are derived values, the same frame until their extract is
+        # refreshed, so each is hashed once rather than on every load
+        with self._lock:
+            held = self._digests.get(id(frame))
+        if held is not None:
+            return held[1]
+        digest = table_digest(frame)
+        with self._lock:
+            self._digests[id(frame)] = (frame, digest)
+            while len(self._digests) > 16:
+                del self._digests[next(iter(self._digests))]
+        return digest
+
+    def _fetch(self, query, cache_key, condition, period, use_store=True, binds=None, uploads=None):
+        """Run ``query`` with ``binds`` on a session holding ``uploads`` (see ``versioned_tables``)."""
+        file_path = query.path
+        uploads = uploads or {}
+        missing = query.binds.difference(binds or ())
+        if missing:
+            raise ValueError(f"{file_path}: no value for bind parameters {sorted(missing)}")
+        missing = query.tables.difference(uploads)
+        if missing:
+            raise ValueError(f"{file_path}: no frame for tables {sorted(missing)}")
+        sql_query, params = render(query.text, condition, period, binds)
+        sql_query = rename_tables(sql_query, {declared: name for declared, (name, _) in uploads.items()})
+        with self._lock:
+            self.executions += 1
+        if self.poll_interval:
+            results = self._run_async(sql_query, params, query.schema, uploads)
+        else:
+            results = self._on_session(uploads, lambda conn: execute_query(conn, sql_query, params, query.schema))
+        self.cache.put(cache_key, results, query_name=file_path)
+        if use_store and self.store is not None:
+            try:
+                self.store.put(cache_key, results, file_path, describe_params(cache_key))
+            except OSError:
+                # Persisting is best effort; the fresh result is still served
+                logger.exception("Could not persist result of %s", file_path)
+        return results
+
+    def _run_async(self, sql_query, params, schema, uploads=None):
+        started = time.perf_counter()
+        query_id = self._on_session(uploads, lambda conn: submit_query(conn, sql_query, params))
+        delay = self.poll_interval
+        while self.pool.run(lambda conn: query_running(conn, query_id)):
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+        annotate(execution_time=time.perf_counter() - started)
+        return self.pool.run(lambda conn: fetch_query_result(conn, query_id, schema))
+
+    def _on_session(self, uploads, fn):
+        """``fn(conn)`` on a session holding ``uploads`` (see ``versioned_tables``).
+
+        Tables are named after their content, so a session's copy is never
+        replaced under a query still reading it. A session that already
+        holds them is preferred, and with async queries (which hold a
+        session only to submit) uploads of the same tables wait for each
+        other, so one upload serves every query over the same content.
+        """
+        if not uploads:
+            return self.pool.run(fn)
+        wanted = {name for name, _ in uploads.values()}
+
+        def holds(conn):
+            return wanted <= self._sessions.get(conn, {}).keys()
+
+        def run(conn):
+            with self._lock:
+                held = self._sessions.setdefault(conn, {})
+            for declared, (name, frame) in uploads.items():
+                if name in held:
+                    continue
+                upload_tables(conn, {name: frame})
+                # Older versions go, bar the last one: a query in flight may still read it
+                older = [table for table, of in held.items() if of == declared][:-1]
+                drop_tables(conn, older)
+                for table in older:
+                    del held[table]
+                held[name] = declared
+            return fn(conn)
+
+        if not self.poll_interval:
+            return self.pool.run(run, prefer=holds)
+        with self._lock:
+            lock = self._upload_locks.setdefault(frozenset(uploads), threading.Lock())
+        with lock:
+            return self.pool.run(run, prefer=holds)
+
+    def _revalidate(self, query, cache_key, condition, period, binds=None, uploads=None):
+        if self.background is None:
+            return
+        with self._lock:
+            if cache_key in self._refreshing:
+                return
+            self._refreshing.add(cache_key)
+
+        def refresh():
+            try:
+                self._single_flight(
+                    cache_key,
+                    lambda: self._fetch(
+                        query,
+                        cache_key,
+                        condition,
+                        period,
+                        binds=binds() if binds is not None else None,
+                        uploads=uploads,
+                    ),
+                )
+            except Exception:
+                logger.exception("Background refresh of %s failed", query.path)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(cache_key)
+
+        self.background.submit(refresh)
@@ -0,0 +1,218 @@
+"""Per-query instrumentation of page builds.
+
+The scheduler opens one ``QueryRecord`` per query it runs; code deeper in
+the worker thread (cache lookups, the warehouse round trip, Arrow decode)
+fills in what it knows through ``annotate``. Finished records are kept in
+memory for the diagnostics panel and can be exported as JSON lines and
+as a Prometheus text-format file (e.g. for node_exporter's textfile
+collector).
+
+Only the latest ``max_records`` records are kept, which is enough for
+the p50/p95 summaries; counters and the summaries' ``_sum`` / ``_count``
+are totals since the process started, kept apart from that buffer so
+they never go down.
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+import pandas as pd
+
+_current = threading.local()
+
+
+@dataclass
+class QueryRecord:
+    query: str
+    start_date: str | None
+    period: str
+    submitted_at: float
+    queue_time: float = 0.0
+    wall_time: float = 0.0
+    execution_time: float | None = None
+    build_time: float | None = None
+    rows: int | None = None
+    bytes: int | None = None
+    query_id: str | None = None
+    # memory / store / stale / extract / coalesced (shared another run) / miss
+    cache: str | None = None
+    error: str | None = None
+
+
+NUMERIC_FIELDS = ["queue_time", "wall_time", "execution_time", "build_time", "rows", "bytes"]
+
+
+def annotate(**fields):
+    """Set fields on the record of the query running on this thread, if any."""
+    record = getattr(_current, "record", None)
+    if record is not None:
+        for name, value in fields.items():
+            setattr(record, name, value)
+
+
+class QueryMetrics:
+    def __init__(self, max_records=5000, jsonl_path=None, clock=time.time, timer=time.perf_counter):
+        self._records = deque(maxlen=max_records)
+        # Since the process started: runs by (query, cache outcome), and the
+        # sum and count of each numeric field by (field, query)
+        self._runs = Counter()
+        self._sums = Counter()
+        self._counts = Counter()
+        self._lock = threading.Lock()
+        self.jsonl_path = Path(jsonl_path) if jsonl_path else None
+        self._clock = clock
+        self._timer = timer
+
+    def now(self) -> float:
+        return self._timer()
+
+    @contextmanager
+    def track(self, query, condition, period, submitted):
+        """Time one query run; ``submitted`` is ``now()`` when it was queued."""
+        started = self._timer()
+        record = QueryRecord(
+            query=query,
+            start_date=condition.start.isoformat() if condition.start else None,
+            period=period,
+            submitted_at=self._clock() - (started - submitted),
+            queue_time=started - submitted,
+        )
+        _current.record = record
+        try:
+            yield record
+        except Exception as e:
+            record.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.record = None
+            record.wall_time = self._timer() - submitted
+            self._add(record)
+
+    def _add(self, record):
+        with self._lock:
+            self._records.append(record)
+            self._runs[record.query, record.cache or "none"] += 1
+            for column in NUMERIC_FIELDS:
+                value = getattr(record, column)
+                if value is not None and not math.isnan(value):
+                    self._sums[column, record.query] += value
+                    self._counts[column, record.query] += 1
+            if self.jsonl_path is not None:
+                try:
+                    self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+                    with self.jsonl_path.open("a") as f:
+                        f.write(json.dumps(asdict(record)) + "\n")
+                except OSError:
+                    pass
+
+    def records(self) -> list:
+        with self._lock:
+            return list(self._records)
+
+    def frame(self, records=None) -> pd.DataFrame:
+        records = self.records() if records is None else records
+        frame = pd.DataFrame([asdict(r) for r in records], columns=list(QueryRecord.__dataclass_fields__))
+        # Timings no record has (e.g. every query was a cache hit) would stay object dtype
+        return frame.astype({column: "float64" for column in NUMERIC_FIELDS})
+
+    def summary(self) -> pd.DataFrame:
+        """p50/p95 latencies, cache hit ratio and volume per query file."""
+        df = self.frame()
+        if df.empty:
+            return pd.DataFrame()
+        df["hit"] = df["cache"].isin(["memory", "store", "stale", "extract", "coalesced"])
+        df["coalesced"] = df["cache"].eq("coalesced")
+        grouped = df.groupby("query")
+        return pd.DataFrame({
+            "calls": grouped.size(),
+            "hit_ratio": grouped["hit"].mean(),
+            # Warehouse runs saved by waiting on an identical one in flight
+            "coalesced": grouped["coalesced"].sum(),
+            "wall_p50": grouped["wall_time"].quantile(0.5),
+            "wall_p95": grouped["wall_time"].quantile(0.95),
+            "execution_p50": grouped["execution_time"].quantile(0.5),
+            "execution_p95": grouped["execution_time"].quantile(0.95),
+            "rows": grouped["rows"].sum(),
+            "bytes": grouped["bytes"].sum(),
+            "errors": grouped["error"].count(),
+        }).reset_index()
+
+    def to_jsonl(self) -> str:
+        return "".join(json.dumps(asdict(r)) + "\n" for r in self.records())
+
+    def totals(self):
+        """Copies of the cumulative ``(runs, sums, counts)`` counters."""
+        with self._lock:
+            return Counter(self._runs), Counter(self._sums), Counter(self._counts)
+
+    def to_prometheus(self) -> str:
+        df = self.frame()
+        runs, sums, counts = self.totals()
+        queries = sorted({query for query, _ in runs})
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def sample(name, labels, value):
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                return
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {float(value)!r}")
+
+        for column, help_text in [
+            ("wall_time", "Queue, warehouse and decode time of dashboard queries."),
+            ("queue_time", "Time dashboard queries waited for a worker."),
+            ("execution_time", "Warehouse execution time of dashboard queries that missed every cache."),
+            ("build_time", "Arrow to DataFrame decode time of fetched results."),
+        ]:
+            name = f"tydro_query_{column.removesuffix('_time')}_seconds"
+            metric(name, "summary", help_text)
+            # Quantiles of the recent records only; sum and count of all of them
+            recent = dict(list(df.groupby("query")[column]))
+            for query in queries:
+                if not counts[column, query]:
+                    continue
+                values = recent.get(query, pd.Series(dtype="float64")).dropna()
+                if not values.empty:
+                    for q in (0.5, 0.95):
+                        sample(name, {"query": query, "quantile": q}, float(values.quantile(q)))
+                sample(f"{name}_sum", {"query": query}, float(sums[column, query]))
+                sample(f"{name}_count", {"query": query}, float(counts[column, query]))
+
+        metric("tydro_query_runs_total", "counter", "Dashboard query runs by cache outcome.")
+        for (query, cache), count in sorted(runs.items()):
+            sample("tydro_query_runs_total", {"query": query, "cache": cache}, float(count))
+
+        metric("tydro_query_coalesced_total", "counter", "Warehouse runs saved by sharing an identical query already in flight.")
+        for query in queries:
+            sample("tydro_query_coalesced_total", {"query": query}, float(runs[query, "coalesced"]))
+
+        for column, help_text in [("rows", "Rows fetched from the warehouse."), ("bytes", "Arrow bytes fetched from the warehouse.")]:
+            name = f"tydro_query_fetched_{column}_total"
+            metric(name, "counter", help_text)
+            for query in queries:
+                if counts[column, query]:
+                    sample(name, {"query": query}, float(sums[column, query]))
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path, extra=""):
+        """Write ``to_prometheus()``, followed by ``extra`` metrics in the same format."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written atomically so a scraper never reads half a file
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(self.to_prometheus() + extra)
+        tmp.replace(path)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
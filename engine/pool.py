@@ -0,0 +1,140 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Snowflake error numbers meaning the session is gone and a fresh login is needed:
+# session no longer exists / session expired / auth token expired / connection closed
+SESSION_LOST_ERRNOS = {390111, 390112, 390114, 250002}
+
+
+def is_session_lost(error) -> bool:
+    return getattr(error, "errno", None) in SESSION_LOST_ERRNOS
+
+
+class ConnectionPool:
+    """Bounded pool of warehouse connections shared across reruns and sessions.
+
+    Connections idle for longer than ``idle_timeout`` seconds are closed
+    instead of reused, and ones idle for longer than ``ping_after`` are
+    pinged before checkout. ``run`` transparently retries once on a fresh
+    connection when the session expired underneath a query.
+    """
+
+    def __init__(self, factory, max_size=8, idle_timeout=900.0, ping_after=60.0, clock=time.monotonic):
+        self._factory = factory
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self._clock = clock
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []   # (returned_at, conn), most recently used last
+        self.created = 0
+        self.reused = 0
+        self.discarded = 0
+
+    @contextmanager
+    def connection(self, prefer=None):
+        conn = self._checkout(prefer)
+        try:
+            yield conn
+        except BaseException as e:
+            self._checkin(conn, discard=is_session_lost(e))
+            raise
+        else:
+            self._checkin(conn)
+
+    def run(self, fn, prefer=None):
+        """Call ``fn(conn)`` on a pooled connection, reconnecting once if the session was lost.
+
+        ``prefer(conn)`` picks among idle connections (e.g. the session that
+        already holds a temporary table); any other one is used otherwise.
+        """
+        try:
+            with self.connection(prefer) as conn:
+                return fn(conn)
+        except Exception as e:
+            if not is_session_lost(e):
+                raise
+        with self.connection(prefer) as conn:
+            return fn(conn)
+
+    def prune(self):
+        """Close idle connections that outlived ``idle_timeout``."""
+        now = self._clock()
+        with self._lock:
+            expired = [c for t, c in self._idle if now - t > self.idle_timeout]
+            self._idle = [(t, c) for t, c in self._idle if now - t <= self.idle_timeout]
+        for conn in expired:
+            self._close(conn)
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, conn in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            idle = len(self._idle)
+        return {
+            "max_size": self.max_size,
+            "idle": idle,
+            "created": self.created,
+            "reused": self.reused,
+            "discarded": self.discarded,
+        }
+
+    def _checkout(self, prefer=None):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    returned_at, conn = self._idle.pop(self._pick(prefer)) if self._idle else (None, None)
+                if conn is None:
+                    conn = self._factory()
+                    self.created += 1
+                    return conn
+                if self._is_usable(conn, self._clock() - returned_at):
+                    self.reused += 1
+                    return conn
+                self._close(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _pick(self, prefer):
+        # With _lock held: the most recently used preferred connection, else the most recent
+        if prefer is not None:
+            for position in range(len(self._idle) - 1, -1, -1):
+                if prefer(self._idle[position][1]):
+                    return position
+        return -1
+
+    def _checkin(self, conn, discard=False):
+        try:
+            if discard or conn.is_closed():
+                self._close(conn)
+            else:
+                with self._lock:
+                    self._idle.append((self._clock(), conn))
+        finally:
+            self._slots.release()
+
+    def _is_usable(self, conn, idle_for) -> bool:
+        if idle_for > self.idle_timeout:
+            return False
+        try:
+            if conn.is_closed():
+                return False
+            # Only pay for a server round trip when the session may have gone stale
+            return idle_for <= self.ping_after or conn.is_valid()
+        except Exception:
+            return False
+
+    def _close(self, conn):
+        self.discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
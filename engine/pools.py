@@ -0,0 +1,29 @@
+"""Liquidity pools of the Tydro router, kept as a local index.
+
+The liquidity breakdown used to rediscover its pools on every run: a
+scan of every router token transfer, filtered by a correlated subquery
+on the ``IncreaseLiquidity`` logs. The set of pools only grows, so
+``queries/liquidity-pools.sql`` feeds an incremental extract instead
+(one row per pool and day it was added to, scanned only from the
+extract's watermark on), and the breakdown query gets the known pool
+addresses as a bind parameter and reads just their latest balances.
+"""
+import json
+
+import pandas as pd
+
+
+def pool_addresses(rows: pd.DataFrame) -> pd.Index:
+    return pd.Index(rows['pool_address'].astype(object).unique()).sort_values()
+
+
+def merge_pool_addresses(addresses: pd.Index, new_rows: pd.DataFrame) -> pd.Index:
+    """``addresses`` with the pools in ``new_rows``; rows already seen change nothing."""
+    if new_rows.empty:
+        return addresses
+    return addresses.union(pool_addresses(new_rows))
+
+
+def liquidity_binds(addresses: pd.Index) -> dict:
+    """Bind parameters of ``queries/liquidity-breakdown-by-tydro-tokens.sql``."""
+    return {'pools': json.dumps(addresses.tolist(), separators=(',', ':'))}
@@ -0,0 +1,253 @@
+"""Headless precompute of every dashboard view into the result store.
+
+    python -m engine.precompute                  # a cycle every 5 minutes
+    python -m engine.precompute --once           # one cycle, e.g. from cron
+
+Run from the repository root with the app's ``TYDRO_DATA_DIR`` (or
+``--data-dir``); warehouse credentials come from the ``[snowflake]``
+table of ``.streamlit/secrets.toml``, as for the app.
+
+Each cycle refreshes the daily prices, the events extract and the pool
+index, then goes over every range and period the page offers
+(``engine.sources``), plus the reference data, and re-runs, at most
+``--concurrency`` at a time, each result whose stored snapshot would go
+stale before the next cycle. Combinations that share a result run once:
+daily-grain queries ignore the range and only queries that use
+``{period}`` differ by period. The page then finds fresh snapshots (and
+the extract's latest tail) on disk instead of waiting on the warehouse.
+
+Each cycle's duration is logged and, with the per-query timings, written
+to ``<data dir>/metrics/precompute.prom``.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+import tomllib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+from engine.cache import ResultCache
+from engine.incremental import IncrementalExtract
+from engine.loader import QueryLoader
+from engine.metrics import QueryMetrics
+from engine.pool import ConnectionPool
+from engine.scheduler import QueryScheduler
+from engine.sources import (
+    DAILY_QUERIES,
+    DEFAULT_QUERY_TTL,
+    LIQUIDITY_QUERY,
+    LIQUIDITY_POOLS_QUERY,
+    PERIOD_CHOICES,
+    QUERIES,
+    QUERY_TTLS,
+    REFERENCE_QUERIES,
+    TIME_RANGES,
+    TYDRO_EVENTS_QUERY,
+    fetch_query,
+    query_tables,
+    tail_fetch,
+    time_range,
+)
+from engine.store import ResultStore
+from engine.templates import TimeRange
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 300
+DEFAULT_CONCURRENCY = 4
+
+# As in app.py
+QUERY_POLL_INTERVAL = 0.25
+QUERY_MAX_POLL_INTERVAL = 2.0
+
+
+@dataclass
+class CycleReport:
+    started_at: float
+    seconds: float
+    results: int
+    refreshed: int
+    failed: int
+
+
+class Precompute:
+    """Refreshes every result the page can ask for through ``fetch_query``.
+
+    ``interval`` is the time between cycle starts; a result is re-run when
+    its snapshot would be past the store's staleness threshold by the next
+    cycle.
+    """
+
+    def __init__(self, loader, extract, pools, prices, executor, metrics=None, interval=DEFAULT_INTERVAL, clock=time.time, timer=time.perf_counter):
+        self.loader = loader
+        self.extract = extract
+        self.pools = pools
+        self.prices = prices
+        self.executor = executor
+        self.metrics = metrics
+        self.interval = interval
+        self._clock = clock
+        self._timer = timer
+        self.cycles = 0
+
+    def results(self, today=None) -> list:
+        """Distinct ``(file_path, condition, period)`` over every range x period."""
+        results = {}
+        for choice in TIME_RANGES:
+            condition = time_range(choice, today)
+            for period in PERIOD_CHOICES.values():
+                for file_path in QUERIES + REFERENCE_QUERIES:
+                    if file_path == TYDRO_EVENTS_QUERY:
+                        # Refreshed once per cycle as the extract
+                        continue
+                    query_condition = TimeRange() if file_path in DAILY_QUERIES else condition
+                    key = self.cache_key(file_path, query_condition, period)
+                    results.setdefault((file_path, key), (file_path, query_condition, period))
+        return list(results.values())
+
+    def cache_key(self, file_path, condition, period):
+        # Queries over uploaded tables are keyed by the tables' content as well
+        tables = query_tables(self.loader, self.extract, self.prices, file_path, condition, period)
+        try:
+            return self.loader.cache_key(file_path, condition, period, tables)
+        except Exception:
+            # No tables without the events extract; the result is then due,
+            # and its run fails (and is counted) like any other
+            logger.exception("Building the tables of %s failed", file_path)
+            return (file_path, condition, period)
+
+    def due(self, file_path, condition, period) -> bool:
+        store = self.loader.store
+        age = store.age(self.cache_key(file_path, condition, period))
+        return age is None or age + self.interval >= store.stale_after_for(file_path)
+
+    def run_cycle(self) -> CycleReport:
+        started_at = self._clock()
+        started = self._timer()
+        scheduler = QueryScheduler(
+            self.executor,
+            partial(fetch_query, self.loader, self.extract, self.pools, self.prices, refresh=True),
+            metrics=self.metrics,
+        )
+        failed = 0
+
+        # The user-flow binds are taken from the extract, so it goes first (and
+        # tops up the prices it is valued with)
+        try:
+            scheduler.result(TYDRO_EVENTS_QUERY, TimeRange(), "day")
+        except Exception:
+            logger.exception("Refreshing the events extract failed")
+            failed += 1
+        # Likewise the liquidity binds from the pool index, if the breakdown is due
+        if self.due(LIQUIDITY_QUERY, TimeRange(), "day"):
+            try:
+                self.pools.refresh(tail_fetch(self.loader, LIQUIDITY_POOLS_QUERY, "day"))
+            except Exception:
+                logger.exception("Refreshing the pool index failed")
+                failed += 1
+
+        results = self.results()
+        due = [result for result in results if self.due(*result)]
+        futures = [scheduler.submit(*result) for result in due]
+        for (file_path, condition, period), future in zip(due, futures):
+            try:
+                future.result()
+            except Exception:
+                logger.exception("Precompute of %s (%s, %s) failed", file_path, condition, period)
+                failed += 1
+
+        self.cycles += 1
+        report = CycleReport(started_at, self._timer() - started, len(results) + 1, len(due) + 1, failed)
+        logger.info(
+            "cycle %d: refreshed %d of %d results in %.1fs, %d failed",
+            self.cycles, report.refreshed, report.results, report.seconds, report.failed,
+        )
+        return report
+
+    def run(self, once=False, metrics_path=None):
+        """Run cycles every ``interval`` seconds (one with ``once``); the last report is returned."""
+        while True:
+            report = self.run_cycle()
+            if metrics_path is not None and self.metrics is not None:
+                try:
+                    self.metrics.write_prometheus(metrics_path, cycle_metrics(report, self.cycles))
+                except OSError:
+                    logger.exception("Could not write %s", metrics_path)
+            if once:
+                return report
+            if report.seconds > self.interval:
+                logger.warning("cycle took %.1fs, longer than the %ss interval", report.seconds, self.interval)
+            time.sleep(max(0.0, report.started_at + self.interval - self._clock()))
+
+
+def cycle_metrics(report, cycles) -> str:
+    """Prometheus text for the last cycle."""
+    lines = []
+    for name, kind, help_text, value in [
+        ("tydro_precompute_cycle_seconds", "gauge", "Duration of the last precompute cycle.", report.seconds),
+        ("tydro_precompute_cycle_started_timestamp_seconds", "gauge", "Start of the last precompute cycle.", report.started_at),
+        ("tydro_precompute_results", "gauge", "Results covered by a precompute cycle.", report.results),
+        ("tydro_precompute_refreshed", "gauge", "Results re-run by the last precompute cycle.", report.refreshed),
+        ("tydro_precompute_failed", "gauge", "Results the last precompute cycle failed to refresh.", report.failed),
+        ("tydro_precompute_cycles_total", "counter", "Precompute cycles since the job started.", cycles),
+    ]:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {float(value)!r}"]
+    return "\n".join(lines) + "\n"
+
+
+def read_credentials(path) -> dict:
+    with open(path, "rb") as f:
+        return dict(tomllib.load(f)["snowflake"])
+
+
+def build(data_dir, credentials, concurrency, interval) -> Precompute:
+    """The app's loader, store and extracts over ``data_dir``, without Streamlit."""
+    import snowflake.connector
+
+    data_dir = Path(data_dir)
+    pool = ConnectionPool(lambda: snowflake.connector.connect(**credentials), max_size=concurrency)
+    loader = QueryLoader(
+        pool,
+        ResultCache(default_ttl=DEFAULT_QUERY_TTL, ttls=QUERY_TTLS),
+        ResultStore(data_dir / "results", default_stale_after=DEFAULT_QUERY_TTL, stale_after=QUERY_TTLS),
+        poll_interval=QUERY_POLL_INTERVAL,
+        max_poll_interval=QUERY_MAX_POLL_INTERVAL,
+    )
+    return Precompute(
+        loader,
+        IncrementalExtract(data_dir / "tydro-events-raw", max_age=DEFAULT_QUERY_TTL),
+        IncrementalExtract(data_dir / "liquidity-pools", max_age=QUERY_TTLS[LIQUIDITY_QUERY]),
+        IncrementalExtract(data_dir / "token-prices", timestamp_column="date", max_age=DEFAULT_QUERY_TTL),
+        ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="tydro-precompute"),
+        metrics=QueryMetrics(jsonl_path=data_dir / "metrics" / "precompute.jsonl"),
+        interval=interval,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m engine.precompute", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--once", action="store_true", help="run one cycle and exit (status 1 if anything failed)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="seconds between cycle starts")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="warehouse queries in flight at most")
+    parser.add_argument("--data-dir", default=os.environ.get("TYDRO_DATA_DIR", ".tydro-data"))
+    parser.add_argument("--secrets", default=".streamlit/secrets.toml", help="TOML file with a [snowflake] table")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    precompute = build(args.data_dir, read_credentials(args.secrets), args.concurrency, args.interval)
+    try:
+        report = precompute.run(once=args.once, metrics_path=Path(args.data_dir) / "metrics" / "precompute.prom")
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        precompute.executor.shutdown(wait=False, cancel_futures=True)
+        precompute.loader.pool.close_all()
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""Slow-moving reference data, kept locally and joined in pandas.
+
+The events query used to average ``EZ_PRICES_HOURLY`` per day (plus the
+kBTC substitute from the cross-chain prices) and join ``DIM_CONTRACTS``
+for decimals and symbols on every run, and the CEX inflow query read
+``dim_labels`` twice. Daily prices now live in an incremental extract fed
+by ``queries/token-prices-daily.sql`` (only days since its watermark are
+re-averaged); contracts and CEX labels are cached results of their own
+queries with a day-long TTL. The warehouse returns raw amounts and
+addresses, and valuation and labelling are index lookups here.
+
+``ValuedEvents`` keeps the valued event history (and its daily rollup)
+in step with the extract and the reference data: a refresh values only
+the re-fetched tail, and new prices or contracts only the rows they
+change.
+"""
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from engine.lending import EVENT_COLUMNS
+from engine.rollups import DailyRollup, truncate_dates
+from engine.schema import concat_frames, sort_categories
+
+
+def daily_price_series(prices: pd.DataFrame) -> pd.Series:
+    """``token_price_usd`` indexed by ``(date, token_address)``."""
+    return (
+        prices.assign(token_address=prices['token_address'].astype(object))
+        .set_index(['date', 'token_address'])['token_price_usd']
+    )
+
+
+def value_events(raw: pd.DataFrame, prices: pd.DataFrame, contracts: pd.DataFrame) -> pd.DataFrame:
+    """Rows of ``queries/tydro-events.sql`` with ``amount`` and ``amount_usd``, as ``EVENT_COLUMNS``.
+
+    A row's own ``symbol`` / ``decimals`` (set for native ETH) win over
+    the contract's; prices are the token's average on the event's day.
+    """
+    contracts = contracts.drop_duplicates('address').set_index('address')
+    token = raw['token_address'].astype(object)
+    symbol = raw['symbol'].astype(object).fillna(contracts['symbol'].astype(object).reindex(token).set_axis(raw.index))
+    decimals = raw['decimals'].fillna(contracts['decimals'].reindex(token).set_axis(raw.index))
+    amount = raw['raw_amount'] / np.power(10.0, decimals.astype('float64'))
+
+    price = (
+        daily_price_series(prices)
+        .reindex(pd.MultiIndex.from_arrays([raw['block_timestamp'].dt.normalize(), token]))
+        .to_numpy()
+    )
+    events = raw.assign(
+        # float64 like amount_usd: the by-token charts sum and average it
+        amount=amount,
+        symbol=symbol.astype('category'),
+        amount_usd=amount * price,
+    )
+    return sort_categories(events[EVENT_COLUMNS])
+
+
+def changed_prices(old: pd.DataFrame, new: pd.DataFrame) -> pd.MultiIndex:
+    """``(date, token_address)`` pairs two daily price tables price differently (or only one prices)."""
+    old, new = daily_price_series(old).align(daily_price_series(new))
+    same = (old == new) | (old.isna() & new.isna())
+    return old.index[~same.to_numpy()]
+
+
+def changed_contracts(old: pd.DataFrame, new: pd.DataFrame) -> pd.Index:
+    """Addresses whose symbol or decimals differ between two contract tables (or that only one has)."""
+    old, new = (
+        contracts.drop_duplicates('address').set_index('address')[['symbol', 'decimals']].astype(object)
+        for contracts in (old, new)
+    )
+    old, new = old.align(new)
+    same = ((old == new) | (old.isna() & new.isna())).all(axis=1)
+    return old.index[~same.to_numpy()]
+
+
+class ValuedEvents:
+    """The events extract valued with ``prices`` and ``contracts``, and its ``DailyRollup``.
+
+    ``revise`` is how it follows the extract and the reference data: only
+    the rows re-fetched or valued with a changed price or contract are
+    valued again, and only the days they fall on are rolled up again.
+    The rollup is built on first use.
+    """
+
+    def __init__(self, events: pd.DataFrame, prices: pd.DataFrame, contracts: pd.DataFrame, rollup=None):
+        self.events = events
+        self.prices = prices
+        self.contracts = contracts
+        self._rollup = rollup
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_raw(cls, raw: pd.DataFrame, prices: pd.DataFrame, contracts: pd.DataFrame) -> 'ValuedEvents':
+        return cls(value_events(raw, prices, contracts), prices, contracts)
+
+    @property
+    def rollup(self) -> DailyRollup:
+        with self._lock:
+            if self._rollup is None:
+                self._rollup = DailyRollup.from_events(self.events)
+            return self._rollup
+
+    def revise(self, raw: pd.DataFrame, since, prices: pd.DataFrame, contracts: pd.DataFrame) -> 'ValuedEvents':
+        """These events for ``raw`` (rows on or after the day ``since`` replaced) and new reference data."""
+        ts = 'block_timestamp'
+        if since is None:
+            kept, raw_kept, tail = self.events, raw, raw.iloc[:0]
+            days = pd.DatetimeIndex([])
+        else:
+            # Both are sorted by time: the rows before ``since`` are the same in each
+            cutoff = pd.Timestamp(since)
+            kept = self.events.iloc[:self.events[ts].searchsorted(cutoff)]
+            split = raw[ts].searchsorted(cutoff)
+            raw_kept, tail = raw.iloc[:split], raw.iloc[split:]
+            # Days the tail covered before and after the refresh
+            replaced = pd.concat([self.events[ts].iloc[len(kept):], tail[ts]])
+            days = pd.DatetimeIndex(truncate_dates(replaced, 'day').unique())
+        stale = self._stale(raw_kept, prices, contracts)
+        if not stale.any():
+            if since is None:
+                return ValuedEvents(self.events, prices, contracts, self._rollup)
+            events = concat_frames([kept, value_events(tail, prices, contracts)])
+        else:
+            revalued = value_events(raw_kept[stale], prices, contracts)
+            events = concat_frames([kept[~stale], revalued, value_events(tail, prices, contracts)])
+            # Back into time order: revalued rows sit where they were
+            order = np.concatenate([np.flatnonzero(~stale), np.flatnonzero(stale), np.arange(len(kept), len(events))])
+            events = events.take(np.argsort(order, kind='stable')).reset_index(drop=True)
+            days = days.union(truncate_dates(revalued[ts], 'day').unique())
+        rollup = self._rollup.replace_days(events, days) if self._rollup is not None else None
+        return ValuedEvents(events, prices, contracts, rollup)
+
+    def _stale(self, raw, prices, contracts) -> np.ndarray:
+        # Rows of ``raw`` valued with a price or contract that has changed since
+        stale = np.zeros(len(raw), dtype=bool)
+        if prices is not self.prices:
+            changed = changed_prices(self.prices, prices)
+            if len(changed):
+                day = raw['block_timestamp'].dt.normalize()
+                candidates = day.isin(changed.get_level_values(0)).to_numpy()
+                keys = pd.MultiIndex.from_arrays([day[candidates], raw['token_address'][candidates].astype(object)])
+                stale[candidates] = keys.isin(changed)
+        if contracts is not self.contracts:
+            tokens = changed_contracts(self.contracts, contracts)
+            if len(tokens):
+                stale |= raw['token_address'].astype(object).isin(tokens).to_numpy()
+        return stale
+
+
+def cex_binds(labels: pd.DataFrame) -> dict:
+    """Bind parameters of ``queries/cex-to-ink-inflow-volume-by-chain.sql``."""
+    addresses = sorted(labels['address'].unique())
+    return {'cex': json.dumps(addresses, separators=(',', ':'))}
+
+
+def label_cex_inflows(inflows: pd.DataFrame, labels: pd.DataFrame) -> pd.DataFrame:
+    """Daily inflows per CEX address -> per CEX label (``date``, ``label``, ``volume_usd``)."""
+    labelled = inflows.merge(labels, left_on='from_address', right_on='address')
+    return labelled.groupby(['date', 'label'], as_index=False, observed=True)['volume_usd'].sum(min_count=1)
@@ -0,0 +1,137 @@
+"""The ``queries/*.sql`` files, read and checked once per process.
+
+A ``CompiledQuery`` holds everything the loader used to derive from the
+file text on every call: the declared output schema, which placeholders
+the template uses, the bind parameters it references, the local tables
+it reads (``-- table: <name>``, uploaded by the loader before each run)
+and the content hash results are cached under. Files are compiled when the registry is
+created, so a malformed header or a misspelt placeholder fails at
+startup, naming the file, rather than as a warehouse error at runtime.
+
+``QueryRegistry.get`` only stats the file afterwards and recompiles it
+when its mtime changed, so edited queries are picked up without a
+restart (and get a new cache key with their new hash).
+"""
+import os
+import re
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import pyarrow as pa
+
+from engine.cache import content_hash
+from engine.schema import parse_schema
+from engine.templates import BIND_REFERENCE, PLACEHOLDER
+
+QUERIES_DIR = "queries"
+
+# Anything shaped like a placeholder, to catch e.g. ``{conditon}``
+PLACEHOLDER_LIKE = re.compile(r"\{[A-Za-z_][\w.]*(?::[^{}\s]*)?\}")
+
+TABLE_DECLARATION = re.compile(r"^--\s*table:\s*(\w+)\s*$", re.MULTILINE)
+
+
+@dataclass(frozen=True)
+class CompiledQuery:
+    path: str
+    text: str
+    schema: pa.Schema
+    content_hash: str
+    uses_condition: bool
+    uses_period: bool
+    # Names of the ``%(name)s`` parameters the caller must bind
+    binds: frozenset
+    # Names of the temporary tables the caller must upload
+    tables: frozenset = frozenset()
+    mtime_ns: int = 0
+
+    def cache_key(self, condition, period, tables=()):
+        # Only the parameters a query actually uses take part in its key,
+        # so e.g. switching the period does not invalidate period-less queries.
+        # A query reading uploaded tables is also keyed by their content
+        # (``tables``: the uploads' content-versioned names)
+        key = (
+            self.content_hash,
+            condition if self.uses_condition else None,
+            period if self.uses_period else None,
+        )
+        return key + (tuple(sorted(tables)),) if self.tables else key
+
+
+def compile_query(path: str, text: str, mtime_ns=0) -> CompiledQuery:
+    """Parse and validate one query file; ``ValueError`` names the file and the problem."""
+    try:
+        schema = parse_schema(text)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from None
+    if not schema.names:
+        raise ValueError(f"{path}: no '-- column: <name> <type>' declarations")
+    duplicates = sorted({name for name in schema.names if schema.names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"{path}: columns declared more than once: {duplicates}")
+
+    placeholders = {m.group(0) for m in PLACEHOLDER_LIKE.finditer(text)}
+    unknown = sorted(p for p in placeholders if not PLACEHOLDER.fullmatch(p))
+    if unknown:
+        raise ValueError(f"{path}: unknown placeholders {unknown}; use {{condition[:column]}} or {{period}}")
+
+    names = {m.group(1) for m in PLACEHOLDER.finditer(text)}
+    return CompiledQuery(
+        path=path,
+        text=text,
+        schema=schema,
+        content_hash=content_hash(text),
+        uses_condition="condition" in names,
+        uses_period="period" in names,
+        binds=frozenset(m.group(1) for m in BIND_REFERENCE.finditer(text) if m.group(1)),
+        tables=frozenset(m.group(1).lower() for m in TABLE_DECLARATION.finditer(text)),
+        mtime_ns=mtime_ns,
+    )
+
+
+class QueryRegistry:
+    """Compiled query files by path, as passed around (``queries/<name>.sql``)."""
+
+    def __init__(self, directory=QUERIES_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+        self._queries = {}
+        for path in sorted(self.directory.glob("*.sql")):
+            self.get(str(path))
+
+    def get(self, file_path: str) -> CompiledQuery:
+        file_path = str(file_path)
+        try:
+            mtime_ns = os.stat(file_path).st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(f"SQL file not found: {file_path}") from None
+        query = self._queries.get(file_path)
+        if query is not None and query.mtime_ns == mtime_ns:
+            return query
+        with self._lock:
+            query = self._queries.get(file_path)
+            if query is None or query.mtime_ns != mtime_ns:
+                query = compile_query(file_path, Path(file_path).read_text(), mtime_ns)
+                self._queries[file_path] = query
+            return query
+
+    def schema(self, file_path: str) -> pa.Schema:
+        """``file_path``'s declared schema; as last compiled if the file has since been removed."""
+        try:
+            return self.get(file_path).schema
+        except FileNotFoundError:
+            query = self._queries.get(str(file_path))
+            if query is None:
+                raise
+            return query.schema
+
+    def paths(self) -> list:
+        return list(self._queries)
+
+
+@lru_cache(maxsize=None)
+def default_registry() -> QueryRegistry:
+    """The process-wide registry of ``queries/``, relative to the working directory."""
+    return QueryRegistry()
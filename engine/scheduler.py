@@ -0,0 +1,85 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+class QueryScheduler:
+    """Submits a page's queries up front onto a shared, bounded executor.
+
+    ``fetch(file_path, condition, period)`` runs on the worker threads;
+    identical submissions within one page build share a single future.
+    With ``metrics`` set, every run is recorded (see ``engine.metrics``)
+    and this build's records are collected in ``records``.
+    """
+
+    def __init__(self, executor, fetch, metrics=None):
+        self._executor = executor
+        self._fetch = fetch
+        self._metrics = metrics
+        self._futures = {}
+        self.records = []
+
+    def submit(self, file_path, condition, period):
+        key = (file_path, condition, period)
+        future = self._futures.get(key)
+        if future is None:
+            if self._metrics is None:
+                future = self._executor.submit(self._fetch, file_path, condition, period)
+            else:
+                future = self._executor.submit(self._tracked, file_path, condition, period, self._metrics.now())
+            self._futures[key] = future
+        return future
+
+    def _tracked(self, file_path, condition, period, submitted):
+        with self._metrics.track(file_path, condition, period, submitted) as record:
+            self.records.append(record)
+            return self._fetch(file_path, condition, period)
+
+    def prefetch(self, file_paths, condition, period):
+        """Queue ``file_paths`` without waiting on them, so later pages find them cached."""
+        for file_path in file_paths:
+            self.submit(file_path, condition, period)
+
+    def result(self, file_path, condition, period):
+        return self.submit(file_path, condition, period).result()
+
+    def done(self, file_path, condition, period):
+        return self.submit(file_path, condition, period).done()
+
+
+class Section:
+    """A page section waiting on its queries.
+
+    ``partial`` sections render as soon as any of their queries finishes
+    and re-render as each further one lands; others render once, when all
+    of their queries are done.
+    """
+
+    def __init__(self, placeholder, render, futures, partial=False):
+        self.placeholder = placeholder
+        self.render = render
+        self.futures = futures
+        self.partial = partial
+        self.rendered = 0
+
+    def completed(self):
+        return sum(f.done() for f in self.futures)
+
+    def ready(self):
+        return self.completed() == len(self.futures)
+
+
+def render_when_ready(sections):
+    """Render each section into its placeholder as soon as its queries finish."""
+    pending = list(sections)
+    while pending:
+        waiting = [f for s in pending for f in s.futures if not f.done()]
+        if waiting:
+            wait(waiting, return_when=FIRST_COMPLETED)
+        for section in list(pending):
+            completed = section.completed()
+            if completed == len(section.futures):
+                pending.remove(section)
+            elif not (section.partial and completed > section.rendered):
+                continue
+            section.rendered = completed
+            with section.placeholder.container():
+                section.render()
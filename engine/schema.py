@@ -0,0 +1,106 @@
+"""Declared result schemas and the typed (Arrow) decode path.
+
+Every query file declares its output columns in its header::
+
+    -- column: volume_usd float64
+
+Results are cast batch by batch to that schema straight from the
+connector's Arrow batches, so numeric columns never round-trip through
+Python objects or strings.
+
+Cached results are held for every range and period at once, so they are
+kept compact: low-cardinality text (symbols, chains, event names) is
+declared ``category`` and decodes to a pandas Categorical, counts that
+fit are declared ``int32``, and values that are only shown (e.g. a
+pool's native liquidity) ``float32``. Anything summed or averaged, USD
+values and native event amounts alike, stays ``float64``.
+"""
+import re
+
+import pandas as pd
+import pyarrow as pa
+
+ARROW_TYPES = {
+    "string": pa.string(),
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "int32": pa.int32(),
+    "int64": pa.int64(),
+    "float32": pa.float32(),
+    "float64": pa.float64(),
+    "timestamp": pa.timestamp("ns"),
+    "date": pa.timestamp("ns"),
+}
+
+COLUMN_DECLARATION = re.compile(r"^--\s*column:\s*(\w+)\s+(\w+)\s*$", re.MULTILINE)
+
+
+def parse_schema(sql_text: str) -> pa.Schema:
+    fields = []
+    for name, type_name in COLUMN_DECLARATION.findall(sql_text):
+        if type_name not in ARROW_TYPES:
+            raise ValueError(f"Unknown column type {type_name!r} for column {name!r}")
+        fields.append(pa.field(name.lower(), ARROW_TYPES[type_name]))
+    return pa.schema(fields)
+
+
+def empty_frame(schema: pa.Schema) -> pd.DataFrame:
+    return schema.empty_table().to_pandas()
+
+
+def conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    # Snowflake reports upper-case names and NUMBER(38, s) decimals
+    table = table.rename_columns([c.lower() for c in table.column_names])
+    missing = [name for name in schema.names if name not in table.column_names]
+    if missing:
+        raise ValueError(f"Query result is missing declared columns: {missing}")
+    return table.select(schema.names).cast(schema)
+
+
+def arrow_to_frame(batches, schema: pa.Schema) -> pd.DataFrame:
+    tables = [conform(batch, schema) for batch in batches]
+    if not tables:
+        return empty_frame(schema)
+    # Each batch brings its own dictionaries; one set of categories per column
+    table = pa.concat_tables(tables).unify_dictionaries()
+    del tables
+    return sort_categories(table.to_pandas(split_blocks=True, self_destruct=True))
+
+
+def sort_categories(frame: pd.DataFrame) -> pd.DataFrame:
+    # Categories come in order of first appearance; sorted, groupby and
+    # sort_values order them as they did the plain strings
+    for column, dtype in frame.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) and not dtype.categories.is_monotonic_increasing:
+            frame[column] = frame[column].cat.reorder_categories(dtype.categories.sort_values())
+    return frame
+
+
+def concat_frames(frames) -> pd.DataFrame:
+    """``pd.concat`` that keeps categorical columns categorical.
+
+    Plain ``pd.concat`` turns categoricals with differing categories into
+    object columns. Text and float columns of earlier frames (e.g. extract
+    partitions persisted under an older schema) take the last frame's dtype.
+    """
+    frames = list(frames)
+    casts = {}
+    for column, dtype in frames[-1].dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            # Empty frames add no categories (and would trip pandas' concat of empty arrays)
+            values = [pd.Series(f[column].unique()) for f in frames if column in f.columns and len(f)]
+            values = pd.concat(values, ignore_index=True).dropna().unique() if values else []
+            casts[column] = pd.CategoricalDtype(pd.Index(values).sort_values())
+        elif pd.api.types.is_float_dtype(dtype):
+            casts[column] = dtype
+    return pd.concat(
+        [f.astype({c: t for c, t in casts.items() if c in f.columns and f[c].dtype != t}) for f in frames],
+        ignore_index=True,
+    )
+
+
+def rows_to_frame(rows, schema: pa.Schema) -> pd.DataFrame:
+    # Fallback for result sets the connector cannot hand over as Arrow
+    if not rows:
+        return empty_frame(schema)
+    table = pa.Table.from_pylist([dict(zip(schema.names, row)) for row in rows])
+    return arrow_to_frame([table], schema)
@@ -0,0 +1,183 @@
+"""Mergeable sketches for metrics that cannot be re-aggregated from bucket values.
+
+Sketches are kept as plain long-format DataFrames (one row per centroid)
+so that building, merging and querying them for thousands of buckets at
+once stays vectorized.
+"""
+import numpy as np
+import pandas as pd
+
+# 2**14 registers: ~0.8% standard error, and small counts (the usual
+# daily bucket) are near-exact through linear counting
+HLL_PRECISION = 14
+
+# A digest holds at most ~compression / 2 centroids; digests of fewer than
+# ~compression / pi values keep every value, so their quantiles are exact
+TDIGEST_COMPRESSION = 300
+
+# Dense registers held at once while counting (2**14 bytes per group)
+HLL_DENSE_BYTES = 16 << 20
+_INVERSE_POWERS = np.exp2(-np.arange(64, dtype=np.float32))
+
+
+def group_codes(frame, keys):
+    """Group number of every row of ``frame`` by ``keys``, and the groups' keys.
+
+    Groups are numbered in sorted key order, as ``groupby(keys)`` orders
+    them, but without its hashing of the combined keys: each key is
+    factorized on its own and the codes are combined arithmetically.
+    Rows with a missing key get -1.
+    """
+    codes, uniques = [], []
+    for key in keys:
+        column = frame[key]
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # Already coded, in category order; unused categories form no group
+            c = column.cat.codes.to_numpy()
+            u = pd.Categorical.from_codes(np.arange(len(column.cat.categories)), dtype=column.dtype)
+        else:
+            c, u = pd.factorize(column, sort=True)
+        codes.append(c)
+        uniques.append(u)
+    shape = tuple(max(len(u), 1) for u in uniques)
+    missing = np.logical_or.reduce([c < 0 for c in codes]) if len(frame) else np.zeros(0, dtype=bool)
+    if missing.any():
+        codes = [np.where(missing, 0, c) for c in codes]
+    flat = np.ravel_multi_index(codes, shape)
+    present = np.bincount(flat[~missing] if missing.any() else flat, minlength=int(np.prod(shape))) > 0
+    numbers = np.cumsum(present) - 1
+    groups = numbers[flat]
+    if missing.any():
+        groups[missing] = -1
+    key_codes = np.unravel_index(np.flatnonzero(present), shape)
+    index = pd.MultiIndex.from_arrays([u.take(c) for u, c in zip(uniques, key_codes)], names=keys)
+    return groups, index
+
+
+def _sort_by_group(groups, values):
+    # Order by group, then value: two cheaper passes than one np.lexsort
+    by_value = np.argsort(values)
+    return by_value[np.argsort(groups[by_value], kind='stable')]
+
+
+def _group_starts(groups, n):
+    # First position of each group in an array sorted by group number
+    starts = np.zeros(n, dtype=np.int64)
+    starts[1:] = np.cumsum(np.bincount(groups, minlength=n))[:-1]
+    return starts
+
+
+def tdigest_compress(frame, keys, value, weight=None, compression=TDIGEST_COMPRESSION) -> pd.DataFrame:
+    """Build (or merge) one t-digest per ``keys`` group.
+
+    ``frame`` holds raw values, or existing centroids when ``weight`` names
+    their weight column. Returns ``keys + ['mean', 'weight']`` centroids,
+    sorted by ``keys`` and ``mean``.
+    """
+    frame = frame.loc[frame[value].notna()]
+    groups, index = group_codes(frame, keys)
+    values = frame[value].to_numpy(dtype=float)
+    w = frame[weight].to_numpy(dtype=float) if weight else np.ones(len(frame))
+    keep = groups >= 0
+    groups, values, w = groups[keep], values[keep], w[keep]
+    order = _sort_by_group(groups, values)
+    groups, values, w = groups[order], values[order], w[order]
+
+    total = np.bincount(groups, weights=w, minlength=len(index))
+    cumulative = np.cumsum(w)
+    before = cumulative - w
+    before -= before[_group_starts(groups, len(index))][groups]
+    q = np.clip((before + w / 2) / total[groups], 0, 1)
+    # k1 scale function: small centroids near the tails, larger ones in the middle
+    k = np.floor(compression / (2 * np.pi) * np.arcsin(2 * q - 1))
+
+    # k only grows within a group, so each centroid is a run of equal (group, k)
+    first = np.ones(len(groups), dtype=bool)
+    first[1:] = (groups[1:] != groups[:-1]) | (k[1:] != k[:-1])
+    centroid = np.cumsum(first) - 1
+    weights = np.bincount(centroid, weights=w)
+    means = np.bincount(centroid, weights=w * values) / np.where(weights > 0, weights, 1.0)
+    centroids = index.take(groups[first]).to_frame(index=False)
+    return centroids.assign(mean=means, weight=weights)
+
+
+def tdigest_quantile(centroids, keys, q: float) -> pd.Series:
+    """Interpolated ``q``-quantile of every digest, indexed by ``keys``.
+
+    Centroids of several digests sharing the same keys (e.g. the days of
+    a week) are read as one digest.
+    """
+    groups, index = group_codes(centroids, keys)
+    means = centroids['mean'].to_numpy(dtype=float)
+    w = centroids['weight'].to_numpy(dtype=float)
+    keep = groups >= 0
+    groups, means, w = groups[keep], means[keep], w[keep]
+    order = _sort_by_group(groups, means)
+    groups, means, w = groups[order], means[order], w[order]
+    n = len(index)
+
+    starts = _group_starts(groups, n)
+    ends = starts + np.bincount(groups, minlength=n) - 1
+    # Centroid centers on one cumulative scale across groups
+    cumulative = np.cumsum(w)
+    center = cumulative - w / 2
+    base = (cumulative - w)[starts]
+    total = np.bincount(groups, weights=w, minlength=n)
+    target = base + np.maximum(q * total, center[starts] - base)
+
+    # Last centroid of the group whose center is at or before the target
+    at = np.clip(np.searchsorted(center, target, side='right') - 1, starts, ends)
+    following = np.minimum(at + 1, ends)
+    span = center[following] - center[at]
+    step = np.where(span > 0, (target - center[at]) / np.where(span > 0, span, 1.0), 0.0)
+    values = means[at] + step * (means[following] - means[at])
+    return pd.Series(values, index=index if len(keys) > 1 else index.get_level_values(0))
+
+
+def hll_registers(frame, keys, column, precision=HLL_PRECISION) -> pd.DataFrame:
+    """HyperLogLog registers of ``column`` per ``keys`` group.
+
+    Registers are stored sparsely as ``keys + ['register', 'rank']`` rows,
+    at most ``2 ** precision`` per group however many values it holds.
+    """
+    hashes = pd.util.hash_pandas_object(frame[column], index=False).to_numpy()
+    register = (hashes >> np.uint64(64 - precision)).astype(np.int32)
+    # Rank = position of the first set bit in the low 32 bits (ample below ~10^9 distinct values)
+    low = (hashes & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    bit_length = np.where(low > 0, np.floor(np.log2(np.maximum(low, 1))) + 1, 0)
+    rank = (33 - bit_length).astype(np.int8)
+    registers = frame[keys].assign(register=register, rank=rank)
+    return hll_merge(registers, keys)
+
+
+def hll_merge(registers, keys) -> pd.DataFrame:
+    """Union of the sketches sharing the same ``keys`` (register-wise max)."""
+    return registers.groupby(keys + ['register'], as_index=False, sort=True, observed=True)['rank'].max()
+
+
+def hll_count(registers, keys, precision=HLL_PRECISION) -> pd.Series:
+    """Estimated distinct count per ``keys`` group.
+
+    Rows of several sketches sharing the same keys (e.g. the days of a
+    week) count as their union, so they need not be merged first.
+    """
+    m = 2 ** precision
+    groups, index = group_codes(registers, keys)
+    register = registers['register'].to_numpy()
+    rank = registers['rank'].to_numpy()
+    z = np.empty(len(index))
+    empty = np.empty(len(index))
+    # Groups are unioned into dense register arrays a block at a time
+    block = max(1, HLL_DENSE_BYTES // m)
+    for lo in range(0, len(index), block):
+        rows = (groups >= lo) & (groups < lo + block)
+        dense = np.zeros(min(block, len(index) - lo) * m, dtype=np.int8)
+        np.maximum.at(dense, (groups[rows] - lo).astype(np.int64) * m + register[rows], rank[rows])
+        dense = dense.reshape(-1, m)
+        # Empty registers contribute 2**0 each
+        z[lo:lo + len(dense)] = _INVERSE_POWERS[dense].sum(axis=1, dtype=np.float64)
+        empty[lo:lo + len(dense)] = (dense == 0).sum(axis=1)
+    raw = 0.7213 / (1 + 1.079 / m) * m * m / z
+    linear = m * np.log(m / np.where(empty > 0, empty, 1))
+    estimate = np.where((raw > 2.5 * m) | (empty == 0), raw, linear)
+    return pd.Series(np.round(estimate).astype('int64'), index=index if len(keys) > 1 else index.get_level_values(0))
@@ -0,0 +1,242 @@
+"""The dashboard's query files, their freshness settings and how each is fetched.
+
+Shared by ``app.py`` and the headless precompute job
+(``python -m engine.precompute``), so both resolve a (query, range, period)
+to the same cache key and the job's results are the ones the page reads.
+"""
+from functools import partial
+
+import pandas as pd
+
+from engine.loader import empty_result
+from engine.metrics import annotate
+from engine.pools import liquidity_binds, merge_pool_addresses, pool_addresses
+from engine.reference import ValuedEvents, cex_binds, label_cex_inflows, value_events
+from engine.templates import TimeRange
+from engine.touches import first_last_touch, merge_touches, user_flow_binds, user_flow_windows
+
+# Cross-chain holdings: one query per chain, fetched concurrently and
+# cached (and refreshed) independently of the others, each over the users
+# in the local events extract
+HOLDINGS_CHAINS = ["optimism", "ethereum", "arbitrum", "bsc", "base", "avalanche"]
+HOLDINGS_QUERIES = [f"queries/tydro-users-holdings-on-{chain}.sql" for chain in HOLDINGS_CHAINS]
+
+# Supply/Withdraw/Borrow/Repay events every lending section is derived from,
+# kept raw in the events extract and priced locally from the reference data below
+TYDRO_EVENTS_QUERY = "queries/tydro-events.sql"
+# Daily bridge transfers to/from Ink by chain and token; both bridge charts sum it
+BRIDGE_ACTIVITY_QUERY = "queries/bridge-activity-daily.sql"
+# Before -> after transitions, over windows from the local first-touch table,
+# uploaded as a temporary table
+USER_FLOW_QUERY = "queries/user-behavior-before-and-after-tydro-interaction.sql"
+# Latest balances of the pools in the local pool index, which LIQUIDITY_POOLS_QUERY tops up
+LIQUIDITY_QUERY = "queries/liquidity-breakdown-by-tydro-tokens.sql"
+LIQUIDITY_POOLS_QUERY = "queries/liquidity-pools.sql"
+CEX_INFLOWS_QUERY = "queries/cex-to-ink-inflow-volume-by-chain.sql"
+TOTAL_BRIDGE_QUERY = "queries/total-bridge.sql"
+
+# Results built locally from the events extract rather than queried. The
+# page schedules, records and waits on them like the query files
+LENDING_ROLLUP = "rollups/lending-daily"
+
+# Reference data: daily token prices (an incremental extract), token
+# contracts and CEX labels (cached for a day)
+TOKEN_PRICES_QUERY = "queries/token-prices-daily.sql"
+TOKEN_CONTRACTS_QUERY = "queries/token-contracts.sql"
+CEX_LABELS_QUERY = "queries/cex-labels.sql"
+REFERENCE_QUERIES = [TOKEN_CONTRACTS_QUERY, CEX_LABELS_QUERY]
+REFERENCE_TTL = 86400
+
+# Every query the page runs
+QUERIES = [
+    TYDRO_EVENTS_QUERY,
+    BRIDGE_ACTIVITY_QUERY,
+    CEX_INFLOWS_QUERY,
+    TOTAL_BRIDGE_QUERY,
+    USER_FLOW_QUERY,
+    LIQUIDITY_QUERY,
+    *HOLDINGS_QUERIES,
+]
+
+# How far before a user's last / after their first Tydro interaction the
+# user-flow query looks for their neighbouring events
+USER_FLOW_BEFORE_WINDOW = pd.Timedelta(days=7)
+USER_FLOW_AFTER_WINDOW = pd.Timedelta(days=7)
+
+# Seconds a cached result stays fresh; slow-moving snapshots live longer
+DEFAULT_QUERY_TTL = 600
+QUERY_TTLS = {
+    LIQUIDITY_QUERY: 3600,
+    USER_FLOW_QUERY: 1800,
+    **{path: 3600 for path in HOLDINGS_QUERIES},
+    **{path: REFERENCE_TTL for path in REFERENCE_QUERIES},
+}
+
+# Daily-grain results (and their date column): fetched for all history and
+# sliced to the selected range locally, so range switches never hit the warehouse
+DAILY_QUERIES = {
+    TYDRO_EVENTS_QUERY: "block_timestamp",
+    BRIDGE_ACTIVITY_QUERY: "date",
+    CEX_INFLOWS_QUERY: "date",
+    TOTAL_BRIDGE_QUERY: "date",
+}
+
+# Range choice -> trailing offset (none for all history)
+TIME_RANGES = {
+    "All time": None,
+    "Past year": {"years": 1},
+    "Past month": {"months": 1},
+    "Past week": {"days": 7},
+}
+
+# Period choice -> date_trunc part
+PERIOD_CHOICES = {"Daily": "day", "Weekly": "week", "Monthly": "month"}
+
+
+def time_range(choice, today=None) -> TimeRange:
+    offset = TIME_RANGES[choice]
+    return TimeRange() if offset is None else TimeRange.trailing(today, **offset)
+
+
+def tail_fetch(loader, file_path, period):
+    # An extract's tail always comes from the warehouse: a cached one lives as
+    # long as the extract's max_age and could hold no rows newer than the extract
+    return partial(loader.load, file_path, period=period, use_store=False, refresh=True)
+
+
+def load_prices(loader, prices, refresh=False):
+    fetch = tail_fetch(loader, TOKEN_PRICES_QUERY, None)
+    return prices.refresh(fetch) if refresh else prices.get(fetch)
+
+
+def load_valued_events(loader, extract, prices, period, refresh=False) -> ValuedEvents:
+    """The event history in ``extract``, valued with the current reference data.
+
+    The extract persists the rows as the warehouse returned them; valuation
+    is a derived value, revised whenever the extract, the price table or
+    the contracts change, so rows fetched before their day's price or
+    their token's contract arrived are valued once those do.
+    """
+    # Contracts refresh on their own TTL, not with every events refresh. The
+    # events load goes last, so the metrics record describes it
+    contracts = loader.load(TOKEN_CONTRACTS_QUERY, TimeRange(), None)
+    daily_prices = load_prices(loader, prices, refresh)
+    annotate(cache="extract")
+    fetch = tail_fetch(loader, TYDRO_EVENTS_QUERY, period)
+    if refresh:
+        extract.refresh(fetch)
+    else:
+        extract.get(fetch)
+    return extract.derived(
+        "events",
+        partial(ValuedEvents.from_raw, prices=daily_prices, contracts=contracts),
+        inputs=(daily_prices, contracts),
+        revise=lambda valued, raw, since: valued.revise(raw, since, daily_prices, contracts),
+    )
+
+
+def load_events_extract(loader, extract, prices, period, refresh=False):
+    return load_valued_events(loader, extract, prices, period, refresh).events
+
+
+def load_events_rollup(loader, extract, prices, period):
+    # Daily aggregates + digests of the whole history, revised with the valued events
+    return load_valued_events(loader, extract, prices, period).rollup
+
+
+def load_user_flow_windows(loader, extract, prices, condition, period):
+    # Built once per extract refresh and range: the windows are uploaded, and
+    # keyed by their content, on every load of the user-flow query
+    load_events_extract(loader, extract, prices, period)
+    if condition.start is None:
+        # All-time touches are kept up to date with each extract refresh
+        touches = extract.derived("touches", first_last_touch, merge_touches)
+    else:
+        touches = extract.derived(("touches", condition), lambda raw: first_last_touch(condition.select(raw)))
+    return extract.derived(
+        ("user-flow", condition),
+        lambda raw: user_flow_windows(touches, USER_FLOW_BEFORE_WINDOW, USER_FLOW_AFTER_WINDOW),
+        inputs=(touches,),
+    )
+
+
+def load_holdings_tables(loader, extract, prices, period):
+    # All-time users, kept up to date with each extract refresh like the touches
+    load_events_extract(loader, extract, prices, period)
+    touches = extract.derived("touches", first_last_touch, merge_touches)
+    users = extract.derived(
+        "users",
+        lambda raw: pd.DataFrame({"address": touches["user"].astype(object)}),
+        inputs=(touches,),
+    )
+    return {"tydro_users": users}
+
+
+def query_tables(loader, extract, prices, file_path, condition, period):
+    """``tables()`` for a query that reads uploaded tables (see ``QueryLoader.load``), else ``None``."""
+    if file_path == USER_FLOW_QUERY:
+        return lambda: {"tydro_touches": load_user_flow_windows(loader, extract, prices, condition, period)}
+    if file_path in HOLDINGS_QUERIES:
+        return partial(load_holdings_tables, loader, extract, prices, period)
+    return None
+
+
+def load_liquidity_binds(loader, pools, period):
+    # New pools only show up when the index is topped up from its watermark
+    pools.get(tail_fetch(loader, LIQUIDITY_POOLS_QUERY, period))
+    return liquidity_binds(pools.derived("addresses", pool_addresses, merge_pool_addresses))
+
+
+def empty_query_result(file_path) -> pd.DataFrame:
+    """An empty frame shaped like ``fetch_query``'s result for ``file_path``, to show when it failed.
+
+    Events and CEX inflows are reshaped locally, so their declared schema
+    is not what the page reads.
+    """
+    if file_path == TYDRO_EVENTS_QUERY:
+        return value_events(empty_result(file_path), empty_result(TOKEN_PRICES_QUERY), empty_result(TOKEN_CONTRACTS_QUERY))
+    if file_path == CEX_INFLOWS_QUERY:
+        return label_cex_inflows(empty_result(file_path), empty_result(CEX_LABELS_QUERY))
+    return empty_result(file_path)
+
+
+def fetch_query(loader, extract, pools, prices, file_path, condition, period, refresh=False):
+    """``file_path``'s result for ``condition``/``period``, as the page shows it.
+
+    ``LENDING_ROLLUP`` returns the ``DailyRollup`` of the selected range.
+    ``extract`` is the events extract, ``pools`` the pool index and
+    ``prices`` the daily price extract. With ``refresh`` the warehouse is
+    queried even if a cached or stored result would do, and the new result
+    replaces it.
+    """
+    if file_path == LENDING_ROLLUP:
+        return load_events_rollup(loader, extract, prices, period).select(condition)
+    if file_path == TYDRO_EVENTS_QUERY:
+        # Event history comes from the incremental extract
+        frame = load_events_extract(loader, extract, prices, period, refresh)
+    elif file_path == USER_FLOW_QUERY:
+        # The windows go up as a temporary table; the binds only bound the scan
+        tables = query_tables(loader, extract, prices, file_path, condition, period)
+        return loader.load(
+            file_path,
+            condition,
+            period,
+            binds=lambda: user_flow_binds(tables()["tydro_touches"]),
+            tables=tables,
+            refresh=refresh,
+        )
+    elif file_path in HOLDINGS_QUERIES:
+        tables = query_tables(loader, extract, prices, file_path, condition, period)
+        return loader.load(file_path, condition, period, tables=tables, refresh=refresh)
+    elif file_path == LIQUIDITY_QUERY:
+        binds = partial(load_liquidity_binds, loader, pools, period)
+        return loader.load(file_path, condition, period, binds=binds, refresh=refresh)
+    elif file_path == CEX_INFLOWS_QUERY:
+        labels = loader.load(CEX_LABELS_QUERY, TimeRange(), None)
+        inflows = loader.load(file_path, TimeRange(), period, binds=partial(cex_binds, labels), refresh=refresh)
+        frame = label_cex_inflows(inflows, labels)
+    elif file_path in DAILY_QUERIES:
+        frame = loader.load(file_path, TimeRange(), period, refresh=refresh)
+    else:
+        return loader.load(file_path, condition, period, refresh=refresh)
+    return condition.select(frame, DAILY_QUERIES[file_path])
@@ -0,0 +1,148 @@
+"""On-disk Parquet snapshots of query results.
+
+Each result is written to ``<directory>/<entry id>.parquet`` and described
+by an entry in ``manifest.json`` (query, content hash, parameters,
+fetched-at time and row count), so a freshly started process can serve
+the last known results before the warehouse has answered anything.
+
+The page and the precompute job share one directory. Each update of the
+manifest re-reads it and merges under an exclusive lock on
+``manifest.lock``, so neither process drops the other's entries.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # Not on Windows; updates are then only serialized within the process
+    fcntl = None
+
+
+class ResultStore:
+    def __init__(self, directory, default_stale_after=600.0, stale_after=None, retention=7 * 86400, clock=time.time):
+        self.directory = Path(directory)
+        self.default_stale_after = default_stale_after
+        self.stale_after = dict(stale_after or {})
+        # Snapshots nobody asked for in this long are deleted
+        self.retention = retention
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._manifest = {}
+        self._manifest_mtime = None
+        self._sync()
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.directory / "manifest.json"
+
+    @staticmethod
+    def entry_id(cache_key) -> str:
+        return hashlib.sha256(repr(cache_key).encode("utf-8")).hexdigest()[:32]
+
+    def stale_after_for(self, query_name) -> float:
+        return self.stale_after.get(query_name, self.default_stale_after)
+
+    def get(self, cache_key):
+        """Return ``(frame, age_seconds)`` for a stored snapshot, or ``None``."""
+        entry_id = self.entry_id(cache_key)
+        with self._lock:
+            self._sync()
+            entry = self._manifest.get(entry_id)
+            if entry is None:
+                return None
+            entry["used_at"] = self._clock()
+        try:
+            frame = pd.read_parquet(self.directory / entry["file"])
+        except (OSError, ValueError):
+            # Snapshot vanished or is unreadable; treat it as missing
+            return None
+        return frame, self._clock() - entry["fetched_at"]
+
+    def age(self, cache_key):
+        """Seconds since the snapshot for ``cache_key`` was fetched, or ``None``; reads no data."""
+        with self._lock:
+            self._sync()
+            entry = self._manifest.get(self.entry_id(cache_key))
+            return None if entry is None else self._clock() - entry["fetched_at"]
+
+    def is_stale(self, query_name, age) -> bool:
+        return age >= self.stale_after_for(query_name)
+
+    def put(self, cache_key, frame, query_name, params):
+        entry_id = self.entry_id(cache_key)
+        now = self._clock()
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = self.directory / f"{entry_id}.{os.getpid()}.tmp"
+            frame.to_parquet(tmp, index=False)
+            tmp.replace(self.directory / f"{entry_id}.parquet")
+            with self._manifest_lock():
+                # Whatever another process wrote while the snapshot was saved
+                self._sync(force=True)
+                self._manifest[entry_id] = {
+                    "query": query_name,
+                    "query_hash": cache_key[0],
+                    "params": params,
+                    "fetched_at": now,
+                    "used_at": now,
+                    "rows": len(frame),
+                    "file": f"{entry_id}.parquet",
+                }
+                self._expire(now)
+                self._write_manifest()
+
+    def entries(self) -> list:
+        with self._lock:
+            return [dict(entry, id=entry_id) for entry_id, entry in self._manifest.items()]
+
+    def _expire(self, now):
+        for entry_id, entry in list(self._manifest.items()):
+            if now - entry["used_at"] > self.retention:
+                del self._manifest[entry_id]
+                (self.directory / entry["file"]).unlink(missing_ok=True)
+
+    @contextmanager
+    def _manifest_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.directory / "manifest.lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _sync(self, force=False):
+        # Another process (e.g. the precompute job) may have written snapshots
+        try:
+            mtime = self.manifest_path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._manifest_mtime and not force:
+            return
+        try:
+            on_disk = json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return
+        for entry_id, entry in on_disk.items():
+            mine = self._manifest.get(entry_id)
+            if mine is None or entry["fetched_at"] > mine["fetched_at"]:
+                self._manifest[entry_id] = entry
+            elif entry["used_at"] > mine["used_at"]:
+                mine["used_at"] = entry["used_at"]
+        self._manifest_mtime = mtime
+
+    def _write_manifest(self):
+        tmp = self.manifest_path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self._manifest, indent=1))
+        tmp.replace(self.manifest_path)
+        self._manifest_mtime = self.manifest_path.stat().st_mtime_ns
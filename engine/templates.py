@@ -0,0 +1,87 @@
+"""Rendering of ``queries/*.sql`` templates.
+
+Templates use two placeholders:
+
+* ``{condition}`` - the selected time range on ``block_timestamp``;
+  ``{condition:<column>}`` applies it to another timestamp column (e.g.
+  ``{condition:hour}`` in price CTEs) so the range reaches every CTE that
+  can be pruned by it, not just the outermost select.
+* ``{period}`` - the ``date_trunc`` part, validated against ``PERIODS``.
+
+Range bounds are passed to the connector as bind parameters
+(``pyformat`` style), never spliced into the SQL text. ``TimeRange.select``
+applies the same bound to an already fetched, date-sorted frame.
+"""
+import datetime as dt
+import re
+from dataclasses import dataclass
+
+import pandas as pd
+
+PERIODS = ("day", "week", "month")
+
+PLACEHOLDER = re.compile(r"\{(condition|period)(?::([A-Za-z_][\w.]*))?\}")
+
+# A '%' in the template, possibly starting a ``%(name)s`` bind reference
+BIND_REFERENCE = re.compile(r"%(?:\((\w+)\)s)?")
+
+
+@dataclass(frozen=True)
+class TimeRange:
+    """Inclusive lower bound on event dates; ``start=None`` means all history."""
+
+    start: dt.date | None = None
+
+    @classmethod
+    def trailing(cls, today=None, **offset):
+        # e.g. TimeRange.trailing(months=1) ~ "current_date - interval '1 month'"
+        today = today or pd.Timestamp.now(tz="UTC").date()
+        return cls((pd.Timestamp(today) - pd.DateOffset(**offset)).date())
+
+    def clause(self, column="block_timestamp"):
+        if self.start is None:
+            return "1 = 1", {}
+        return f"{column}::date >= %(start_date)s", {"start_date": self.start.isoformat()}
+
+    def select(self, frame: pd.DataFrame, column="block_timestamp") -> pd.DataFrame:
+        """Local equivalent of ``clause(column)`` for a frame sorted by ``column``."""
+        if self.start is None:
+            return frame
+        # Binary search on the sorted dates; the slice is a view, not a copy
+        first = frame[column].searchsorted(pd.Timestamp(self.start), side="left")
+        return frame.iloc[first:]
+
+
+def render(sql_template: str, time_range: TimeRange, period: str, binds=None):
+    """Return ``(sql, params)`` ready for ``cursor.execute``.
+
+    ``binds`` are further bind parameters the template references directly
+    as ``%(name)s``.
+    """
+    params = dict(binds or {})
+    parts = []
+    last = 0
+    for match in PLACEHOLDER.finditer(sql_template):
+        parts.append((sql_template[last:match.start()], True))
+        name, column = match.groups()
+        if name == "period":
+            if period not in PERIODS:
+                raise ValueError(f"Unsupported period: {period!r}")
+            parts.append((period, False))
+        else:
+            clause, values = time_range.clause(column or "block_timestamp")
+            params.update(values)
+            parts.append((clause, False))
+        last = match.end()
+    parts.append((sql_template[last:], True))
+
+    # With bind parameters the connector treats '%' as a format character;
+    # only the template's own references to ``binds`` stay unescaped
+    def escape(match):
+        return match.group(0) if match.group(1) in params else "%" + match.group(0)
+
+    sql = "".join(
+        BIND_REFERENCE.sub(escape, text) if literal and params else text
+        for text, literal in parts
+    )
+    return sql, params or None
@@ -0,0 +1,57 @@
+"""Per-user first and last Tydro interaction, kept from the events extract.
+
+The user-flow query used to find each user's first and last interaction
+by scanning the event logs twice, then joined every event the user ever
+made. The events extract already holds every interaction, so this table
+is built from it once and then only merged with each refresh's new rows.
+``user_flow_windows`` turns it into the table
+``queries/user-behavior-before-and-after-tydro-interaction.sql`` joins (a
+window around each user's interactions, so the query reads only the events
+next to them rather than the user's whole history), uploaded as a
+temporary table, and ``user_flow_binds`` into the bounds of the whole scan.
+"""
+import pandas as pd
+
+TOUCH_COLUMNS = ['user', 'first_touch', 'last_touch']
+WINDOW_COLUMNS = TOUCH_COLUMNS + ['before_from', 'after_to']
+
+
+def first_last_touch(events: pd.DataFrame) -> pd.DataFrame:
+    return (
+        events.groupby('user', as_index=False, sort=False)['block_timestamp']
+        .agg(first_touch='min', last_touch='max')
+    )[TOUCH_COLUMNS]
+
+
+def merge_touches(touches: pd.DataFrame, new_events: pd.DataFrame) -> pd.DataFrame:
+    """``touches`` updated with ``new_events``; re-merging rows already seen changes nothing."""
+    if new_events.empty:
+        return touches
+    return (
+        pd.concat([touches, first_last_touch(new_events)], ignore_index=True)
+        .groupby('user', as_index=False, sort=False)
+        .agg(first_touch=('first_touch', 'min'), last_touch=('last_touch', 'max'))
+    )[TOUCH_COLUMNS]
+
+
+def user_flow_windows(touches: pd.DataFrame, before: pd.Timedelta, after: pd.Timedelta) -> pd.DataFrame:
+    """``touches`` with the windows the user-flow query reads events from.
+
+    ``before_from`` is ``before`` ahead of the last touch and ``after_to``
+    ``after`` past the first one.
+    """
+    return touches.assign(
+        user=touches['user'].astype(object),
+        before_from=touches['last_touch'] - before,
+        after_to=touches['first_touch'] + after,
+    )[WINDOW_COLUMNS]
+
+
+def user_flow_binds(windows: pd.DataFrame) -> dict:
+    """``events_from`` / ``events_to`` bound the user-flow scan, so it prunes on block_timestamp."""
+    if windows.empty:
+        return {'events_from': None, 'events_to': None}
+    return {
+        'events_from': windows['before_from'].min().isoformat(),
+        'events_to': windows['after_to'].max().isoformat(),
+    }
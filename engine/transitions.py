@@ -0,0 +1,48 @@
+"""Before -> after event transitions of Tydro users, shaped for a Sankey.
+
+``queries/user-behavior-before-and-after-tydro-interaction.sql`` counts
+users per exact (before_event, after_event) pair. Event types beyond the
+``top`` busiest on each side are folded into an "Other" node, and the
+nodes and links are built with pandas / NumPy only, so the diagram costs
+the same to build for a handful of event types as for hundreds.
+"""
+import numpy as np
+import pandas as pd
+
+OTHER = 'Other'
+
+
+def fold_rare(labels: pd.Series, weights: pd.Series, top: int) -> pd.Categorical:
+    """``labels`` as categories ordered by total weight, all but the ``top`` heaviest as ``OTHER``."""
+    labels = labels.astype(object)
+    totals = weights.groupby(labels, sort=False).sum().sort_values(ascending=False, kind='stable')
+    kept = totals.index[:top] if len(totals) > top else totals.index
+    categories = list(kept) + ([OTHER] if len(kept) < len(totals) and OTHER not in kept else [])
+    folded = labels.where(labels.isin(kept), OTHER)
+    return pd.Categorical(folded, categories=categories)
+
+
+def sankey_links(transitions: pd.DataFrame, top=10):
+    """``(nodes, links)`` for a before -> after Sankey.
+
+    ``nodes`` has one row per before node then one per after node
+    (``label``, ``side``, ``event``); ``links`` has ``source`` / ``target``
+    node positions, ``before`` / ``after`` events and ``users``.
+    """
+    weights = transitions['users']
+    before = fold_rare(transitions['before_event'], weights, top)
+    after = fold_rare(transitions['after_event'], weights, top)
+
+    links = (
+        pd.DataFrame({'before': before, 'after': after, 'users': weights.to_numpy()})
+        .groupby(['before', 'after'], observed=True, as_index=False)['users'].sum()
+    )
+    links = links[links['users'] > 0].reset_index(drop=True)
+    links['source'] = links['before'].cat.codes.to_numpy()
+    links['target'] = len(before.categories) + links['after'].cat.codes.to_numpy()
+
+    events = np.concatenate([before.categories.to_numpy(dtype=object), after.categories.to_numpy(dtype=object)])
+    sides = np.repeat(['Before', 'After'], [len(before.categories), len(after.categories)])
+    nodes = pd.DataFrame({'side': sides, 'event': events})
+    nodes['label'] = nodes['side'] + ': ' + nodes['event'].astype(str)
+    return nodes, links
@@ -1,35 +1,47 @@
+-- column: date date
+-- column: direction category
+-- column: chain category
+-- column: symbol category
+-- column: transfers int32
+-- column: volume_usd float64
+-- column: priced_transfers int32
+
 with
 
 main as (
 select
+    block_timestamp::date as date,
     'Inflow' as direction,
     source_chain as chain,
-    count(distinct tx_hash) as transactions,
+    token_symbol as symbol,
+    count(*) as transfers,
     sum(amount_usd) as volume_usd,
-    avg(amount_usd) as average_amount_usd
+    count(amount_usd) as priced_transfers
 from
     bridge_activity.defi.ez_bridge_activity
 where
     'ink' = destination_chain
     and token_symbol in ('GHO', 'USDG', 'WETH', 'USD₮0', 'USDT', 'ETH', 'kBTC')
     and {condition}
-group by 1, 2
+group by 1, 2, 3, 4
 
 union all
 
 select
+    block_timestamp::date as date,
     'Outflow' as direction,
     destination_chain as chain,
-    count(distinct tx_hash) as transactions,
+    token_symbol as symbol,
+    count(*) as transfers,
     sum(amount_usd) as volume_usd,
-    avg(amount_usd) as average_amount_usd
+    count(amount_usd) as priced_transfers
 from
     bridge_activity.defi.ez_bridge_activity
 where
     'ink' = source_chain
     and token_symbol in ('GHO', 'USDG', 'WETH', 'USD₮0', 'USDT', 'ETH', 'kBTC')
     and {condition}
-group by 1, 2
+group by 1, 2, 3, 4
 )
 
-select * from main order by direction, chain
\ No newline at end of file
+select * from main order by date, direction, chain, symbol
@@ -1,35 +0,0 @@
-with
-
-main as (
-select
-    'Inflow' as direction,
-    token_symbol as symbol,
-    count(distinct tx_hash) as transactions,
-    sum(amount_usd) as volume_usd,
-    avg(amount_usd) as average_amount_usd
-from
-    bridge_activity.defi.ez_bridge_activity
-where
-    'ink' = destination_chain
-    and token_symbol in ('GHO', 'USDG', 'WETH', 'USD₮0', 'USDT', 'ETH', 'kBTC')
-    and {condition}
-group by 1, 2
-
-union all
-
-select
-    'Outflow' as direction,
-    token_symbol as symbol,
-    count(distinct tx_hash) as transactions,
-    sum(amount_usd) as volume_usd,
-    avg(amount_usd) as average_amount_usd
-from
-    bridge_activity.defi.ez_bridge_activity
-where
-    'ink' = source_chain
-    and token_symbol in ('GHO', 'USDG', 'WETH', 'USD₮0', 'USDT', 'ETH', 'kBTC')
-    and {condition}
-group by 1, 2
-)
-
-select * from main order by direction, symbol
\ No newline at end of file
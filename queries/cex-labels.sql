@@ -0,0 +1,11 @@
+-- column: address string
+-- column: label category
+
+-- Addresses labelled as centralized exchanges, with the exchange's name
+select
+    distinct address,
+    label
+from
+    ink.core.dim_labels
+where
+    label_type = 'cex'
@@ -1,36 +1,49 @@
+-- column: date date
+-- column: from_address string
+-- column: volume_usd float64
+
 with
 
+-- CEX addresses from the dashboard's cached labels (engine/reference.py),
+-- which also maps them to exchange names
+cex as (
+select
+    t.value::string as address
+from
+    table(flatten(input => parse_json(%(cex)s))) t
+),
+
 from_cex as (
 select
+    block_timestamp::date as date,
     from_address,
     sum(amount_usd) as volume_usd
 from
     ink.core.ez_native_transfers
 where
-    from_address in (select distinct address from ink.core.dim_labels where label_type = 'cex')
+    from_address in (select address from cex)
     and {condition}
-group by 1
+group by 1, 2
     
 union all
 
 select
+    block_timestamp::date as date,
     from_address,
     sum(amount_usd) as volume_usd
 from
     ink.core.ez_token_transfers
 where
-    from_address in (select distinct address from ink.core.dim_labels where label_type = 'cex')
+    from_address in (select address from cex)
     and {condition}
-group by 1
+group by 1, 2
 )
 
 select
-    label,
+    date,
+    from_address,
     sum(volume_usd) as volume_usd
 from
     from_cex
-join
-    ink.core.dim_labels on from_address = address
-where
-    label_type = 'cex'
-group by 1
+group by 1, 2
+order by 1, 2
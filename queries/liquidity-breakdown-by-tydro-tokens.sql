@@ -1,14 +1,15 @@
+-- column: symbol category
+-- column: liquidity float32
+-- column: liquidity_usd float64
+
 with
 
+-- Pools from the dashboard's local pool index (engine/pools.py)
 pools as (
 select
-    distinct to_address as pool_address
+    t.value::string as pool_address
 from
-    ink.core.ez_token_transfers a
-where 
-    origin_to_address = '0x991d5546c4b442b4c5fdc4c8b8b8d131deb24702'
-    and origin_from_address != to_address
-    and tx_hash in (select distinct tx_hash from ink.core.ez_decoded_event_logs b where a.tx_hash = b.tx_hash and b.event_name = 'IncreaseLiquidity')
+    table(flatten(input => parse_json(%(pools)s))) t
 ),
 
 main as (
@@ -0,0 +1,35 @@
+-- column: pool_address string
+-- column: block_timestamp timestamp
+
+-- Pools liquidity was added to through the Tydro router: the recipients of
+-- router transfers in transactions that emitted IncreaseLiquidity. One row
+-- per pool and day; the local pool index (engine/pools.py) only asks for the
+-- days since its watermark
+with
+
+liquidity_txs as (
+select
+    distinct tx_hash
+from
+    ink.core.ez_decoded_event_logs
+where
+    event_name = 'IncreaseLiquidity'
+    and {condition}
+)
+
+select
+    a.to_address as pool_address,
+    min(a.block_timestamp) as block_timestamp
+from
+    ink.core.ez_token_transfers a
+    join liquidity_txs b
+        on a.tx_hash = b.tx_hash
+where
+    a.origin_to_address = '0x991d5546c4b442b4c5fdc4c8b8b8d131deb24702'
+    and a.origin_from_address != a.to_address
+    and {condition:a.block_timestamp}
+group by
+    a.to_address,
+    a.block_timestamp::date
+order by
+    block_timestamp
@@ -0,0 +1,14 @@
+-- column: address string
+-- column: symbol category
+-- column: decimals int32
+
+-- Symbol and decimals of every Ink token contract, for valuing raw amounts
+-- locally (engine/reference.py)
+select
+    address,
+    symbol,
+    decimals
+from
+    INK.CORE.DIM_CONTRACTS
+where
+    decimals is not null
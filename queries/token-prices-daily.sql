@@ -0,0 +1,32 @@
+-- column: date date
+-- column: token_address category
+-- column: token_price_usd float64
+
+-- Average daily USD price per Ink token; kBTC is priced as WBTC on Ethereum.
+-- Kept as a local extract (engine/reference.py) that only asks for the days
+-- since its watermark
+select
+    hour::date as date,
+    token_address,
+    avg(price) as token_price_usd
+from
+    INK.PRICE.EZ_PRICES_HOURLY
+where
+    token_address != '0x73e0c0d45e048d25fc26fa3159b0aa04bfa4db98'
+    and {condition:hour}
+group by 1, 2
+
+union all
+
+select
+    hour::date as date,
+    '0x73e0c0d45e048d25fc26fa3159b0aa04bfa4db98',
+    avg(price) as token_price_usd
+from
+    CROSSCHAIN.price.ez_prices_hourly
+where
+    token_address = '0x2260fac5e5542a773aa44fbcfedf7c193bc2c599'
+    and blockchain = 'ethereum'
+    and {condition:hour}
+group by 1, 2
+order by 1, 2
@@ -0,0 +1,47 @@
+-- column: tx_hash string
+-- column: block_timestamp timestamp
+-- column: user string
+-- column: raw_amount float64
+-- column: token_address category
+-- column: symbol category
+-- column: decimals int32
+-- column: event_name category
+
+-- Raw Supply/Withdraw/Borrow/Repay amounts; decimals, symbols and daily USD
+-- prices are looked up locally (engine/reference.py). Only native ETH rows
+-- carry their own symbol and decimals
+select
+    tx_hash,
+    block_timestamp,
+    origin_from_address as user,
+    decoded_log:amount::double as raw_amount,
+    decoded_log:reserve::string as token_address,
+    null as symbol,
+    null as decimals,
+    event_name
+from
+    INK.CORE.EZ_DECODED_EVENT_LOGS
+where
+    event_name in ('Supply', 'Withdraw', 'Borrow', 'Repay')
+    and origin_to_address = '0x2816cf15f6d2a220e789aa011d5ee4eb6c47feba'
+    and tx_succeeded
+    and {condition}
+
+union all
+
+select
+    tx_hash,
+    block_timestamp,
+    origin_from_address as user,
+    decoded_log:amount::double as raw_amount,
+    '0x4200000000000000000000000000000000000006' as token_address,
+    'ETH' as symbol,
+    18 as decimals,
+    event_name
+from
+    INK.CORE.EZ_DECODED_EVENT_LOGS
+where
+    event_name in ('Supply', 'Withdraw', 'Borrow', 'Repay')
+    and origin_to_address = '0xde090efcd6ef4b86792e2d84e55a5fa8d49d25d2'
+    and tx_succeeded
+    and {condition}
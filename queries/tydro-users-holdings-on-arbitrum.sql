@@ -0,0 +1,50 @@
+-- column: chain category
+-- column: symbol category
+-- column: token_address category
+-- column: balance_usd float64
+
+-- Tydro users' addresses, uploaded from the local events extract (engine/sources.py)
+-- table: tydro_users
+
+with
+
+main as (
+select
+    'Arbitrum' as chain,
+    symbol,
+    contract_address as token_address,
+    address as user,
+    balance,
+    balance_usd
+from
+    arbitrum.balances.ez_balances_erc20_daily
+where
+    address in (select address from tydro_users)
+    and balance_usd > 0
+qualify row_number() over (partition by address, symbol order by block_date desc) = 1
+
+union all
+
+select
+    'Arbitrum' as chain,
+    'ETH' as symbol,
+    null,
+    address as user,
+    balance,
+    balance_usd
+from
+    arbitrum.balances.ez_balances_native_daily
+where
+    address in (select address from tydro_users)
+    and balance_usd > 0
+qualify row_number() over (partition by address, symbol order by block_date desc) = 1
+)
+
+select
+    chain,
+    symbol,
+    token_address,
+    sum(balance_usd) as balance_usd
+from
+    main
+group by 1, 2, 3
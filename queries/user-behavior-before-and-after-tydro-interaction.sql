@@ -1,83 +1,71 @@
-with tydro_events as (
-    select
-        origin_from_address as user,
-        min(block_timestamp) as first_tydro_time
-    from INK.CORE.EZ_DECODED_EVENT_LOGS
-    where
-        event_name in ('Supply', 'Withdraw', 'Borrow', 'Repay')
-        and origin_to_address in (
-            '0x2816cf15f6d2a220e789aa011d5ee4eb6c47feba',
-            '0xde090efcd6ef4b86792e2d84e55a5fa8d49d25d2'
-        )
-        and tx_succeeded
-        and block_timestamp::date >= '2025-10-13'
-	and {condition}
-    group by 1
-
-    union all
+-- column: before_event category
+-- column: after_event category
+-- column: users int32
 
+-- Each Tydro user's first / last interaction in the selected range and the
+-- window around them, uploaded from the dashboard's first-touch table (engine/touches.py)
+-- table: tydro_touches
+with tydro_users as (
     select
-        origin_from_address as user,
-        max(block_timestamp) as first_tydro_time
-    from INK.CORE.EZ_DECODED_EVENT_LOGS
-    where
-        event_name in ('Supply', 'Withdraw', 'Borrow', 'Repay')
-        and origin_to_address in (
-            '0x2816cf15f6d2a220e789aa011d5ee4eb6c47feba',
-            '0xde090efcd6ef4b86792e2d84e55a5fa8d49d25d2'
-        )
-        and tx_succeeded
-        and block_timestamp::date >= '2025-10-13'
-	and {condition}
-    group by 1
+        user,
+        first_touch as first_tydro_time,
+        last_touch as last_tydro_time,
+        before_from,
+        after_to
+    from tydro_touches
 ),
 
+-- Only the events within a user's windows, not their whole history
 user_events as (
     select
         e.origin_from_address as user,
         e.event_name,
-        e.block_timestamp
+        e.block_timestamp,
+        t.first_tydro_time,
+        t.last_tydro_time,
+        t.before_from,
+        t.after_to
     from INK.CORE.EZ_DECODED_EVENT_LOGS e
-    join tydro_events t
+    join tydro_users t
         on e.origin_from_address = t.user
-       -- and e.block_timestamp >= t.first_tydro_time - interval '7 days'
-       -- and e.block_timestamp <= t.first_tydro_time + interval '7 days'
+       and (
+            e.block_timestamp between t.before_from and t.last_tydro_time
+            or e.block_timestamp between t.first_tydro_time and t.after_to
+       )
     where
         e.tx_succeeded
         and event_name != 'Approval'
+        and e.block_timestamp between %(events_from)s and %(events_to)s
 ),
 
+-- A user's last event in the window before their last Tydro interaction ...
 before_actions as (
     select
         user,
-        event_name,
-        'Before' as action_type
-    from user_events u
-    join tydro_events t using(user)
-    where u.block_timestamp < t.first_tydro_time
+        event_name as before_event
+    from user_events
+    where block_timestamp >= before_from and block_timestamp < last_tydro_time
     qualify row_number() over (partition by user order by block_timestamp desc) = 1
 ),
 
+-- ... and first event in the window after their first one
 after_actions as (
     select
         user,
-        event_name,
-        'After' as action_type
-    from user_events u
-    join tydro_events t using(user)
-    where u.block_timestamp > t.first_tydro_time
+        event_name as after_event
+    from user_events
+    where block_timestamp > first_tydro_time and block_timestamp <= after_to
     qualify row_number() over (partition by user order by block_timestamp) = 1
 )
 
+-- One row per (before, after) pair with the number of users who made
+-- exactly that transition; users with nothing in one window count towards '(none)'
 select
-    action_type,
-    event_name,
-    count(distinct user) as users
-from (
-    select * from before_actions
-    union all
-    select * from after_actions
-)
-group by 1,2
-qualify row_number() over (partition by action_type order by users desc) <= 10
-order by 1, users desc
\ No newline at end of file
+    coalesce(b.before_event, '(none)') as before_event,
+    coalesce(a.after_event, '(none)') as after_event,
+    count(*) as users
+from before_actions b
+full outer join after_actions a
+    on b.user = a.user
+group by 1, 2
+order by users desc